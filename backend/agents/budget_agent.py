@@ -1,9 +1,7 @@
-import os
 import re
 import json
-import google.generativeai as genai
-
-genai.configure(api_key=os.getenv('GEMINI_API_KEY', ''))
+from agents.llm_client import generate_text, is_json_response
+from agents.metrics import record_parse_failure
 
 
 async def budget_agent(country: str, locations: str = None, days: int = 3, origin: str = 'United States', additional_details: str = None) -> dict:
@@ -48,19 +46,15 @@ Return ONLY this JSON (no markdown):
 Use 2024-2025 prices. Numbers not strings. Brief notes."""
 
     # Configure model with high token limit to prevent truncation
-    generation_config = genai.types.GenerationConfig(
+    text = await generate_text(
+        prompt,
         temperature=0.1,  # Very low temperature for consistent JSON
         max_output_tokens=4096,  # High limit to ensure completion
+        use_cache=True,
+        cache_if=is_json_response,
+        task='budget'
     )
 
-    model = genai.GenerativeModel(
-        'models/gemini-2.5-flash',
-        generation_config=generation_config
-    )
-
-    response = model.generate_content(prompt)
-    text = response.text
-
     # Remove markdown code blocks if present
     text = re.sub(r'```json\s*\n?', '', text)
     text = re.sub(r'```\s*\n?', '', text)
@@ -84,6 +78,7 @@ Use 2024-2025 prices. Numbers not strings. Brief notes."""
             return budget_data
         else:
             print(f"⚠ Budget data missing required fields")
+            record_parse_failure('budget', 'missing_fields')
             print(f"Received fields: {list(budget_data.keys())}")
             return {
                 'raw': text,
@@ -92,6 +87,7 @@ Use 2024-2025 prices. Numbers not strings. Brief notes."""
 
     except json.JSONDecodeError as e:
         print(f"✗ JSON decode error: {e}")
+        record_parse_failure('budget', 'invalid')
         print(f"Raw response (first 500 chars): {text[:500]}")
         return {
             'raw': text,
@@ -0,0 +1,200 @@
+import os
+import time
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Default location for on-disk caches, next to the development database
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance')
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache with a per-entry expiry time.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    Persistent key/value cache backed by SQLite. Values are stored as JSON.
+    WAL mode lets several worker processes share one file.
+    """
+
+    def __init__(self, path: str, table: str = 'cache', ttl: float = None):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} '
+            '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)'
+        )
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry[0]
+
+    def get_entry(self, key):
+        """(value, expires_at) for a live key, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT value, expires_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return None
+
+        return json.loads(value), expires_at
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value), expires_at)
+            )
+
+    def set_many(self, items: list, ttl: float = None):
+        """Store several (key, value) pairs in one transaction."""
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany(
+                    f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+                    [(key, json.dumps(value), expires_at) for key, value in items]
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def purge_expired(self) -> int:
+        """Delete expired rows. Returns how many were removed."""
+        with self._lock:
+            cursor = self._conn.execute(
+                f'DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at < ?', (time.time(),)
+            )
+            return cursor.rowcount
+
+
+# Every TieredCache by name, so their statistics can be reported in one place
+caches = {}
+
+
+class TieredCache:
+    """
+    In-memory LRU in front of an optional SQLite tier, with hit/miss counters.
+    Disk hits are promoted into memory.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = None, path: str = None):
+        self.name = name
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.disk = SQLiteCache(path, table=name, ttl=ttl) if path else None
+        self._lock = threading.Lock()
+        self._counts = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        caches[name] = self
+
+    def _count(self, field: str):
+        with self._lock:
+            self._counts[field] += 1
+
+    def get(self, key, default=None):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+
+        if self.disk is not None:
+            entry = self.disk.get_entry(key)
+            if entry is not None and entry[0] is not None:
+                value, expires_at = entry
+                self._count('disk_hits')
+                # Keep the entry's remaining lifetime rather than starting a new one
+                self.memory.set(key, value, expires_at - time.time() if expires_at is not None else None)
+                return value
+
+        self._count('misses')
+        return default
+
+    def set(self, key, value, ttl: float = None):
+        self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl)
+
+    def set_many(self, items: list, ttl: float = None):
+        """Store several (key, value) pairs, writing the SQLite tier in one transaction."""
+        for key, value in items:
+            self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            self.disk.set_many(items, ttl)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+
+        hits = counts['memory_hits'] + counts['disk_hits']
+        total = hits + counts['misses']
+        return {
+            **counts,
+            'hits': hits,
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+            'size': len(self.memory)
+        }
@@ -0,0 +1,299 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import tempfile
+import threading
+import aiohttp
+from yarl import URL
+from multidict import CIMultiDict, CIMultiDictProxy
+from agents.metrics import record_upstream
+from agents.tracing import HTTP, start_span
+
+# Record/replay of external API traffic, for reproducible runs without network.
+# 'record' passes requests through to the real services and saves every response,
+# 'replay' answers only from the recordings. Anything else (default) is off.
+HTTP_CASSETTE_MODE = os.getenv('HTTP_CASSETTE_MODE', '').lower()
+HTTP_CASSETTE_DIR = os.getenv(
+    'HTTP_CASSETTE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cassettes')
+)
+# Multiplier on recorded response times during replay: 1 keeps the original
+# timings, 0.5 halves them, 0 replays instantly
+HTTP_CASSETTE_TIME_SCALE = float(os.getenv('HTTP_CASSETTE_TIME_SCALE', 1))
+
+# Query parameters carrying credentials are never written to disk
+REDACTED_PARAMS = {'apikey', 'api_key', 'key', 'token', 'access_token'}
+
+
+def request_key(method: str, url, params=None) -> str:
+    """
+    Stable identity of a request: method plus URL with the query parameters sorted.
+    Headers are ignored, so a changed User-Agent still replays, and credentials
+    are redacted, so recordings replay with any API key.
+    """
+    url = URL(str(url))
+    if params:
+        url = url.update_query(params)
+    return f'{method.upper()} {redact(url, sort=True)}'
+
+
+def redact(url, sort: bool = False) -> str:
+    url = URL(str(url))
+    query = [(name, '***' if name.lower() in REDACTED_PARAMS else value) for name, value in url.query.items()]
+    return str(url.with_query(sorted(query) if sort else query))
+
+
+class CassetteStore:
+    """
+    Recorded interactions on disk, one JSON file per request key holding the
+    responses in the order they were seen. Replay cycles through them, so a
+    request recorded three times answers with the first, second, third, first...
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._replayed = {}  # Key -> number of times replayed
+        self._recorded = set()  # Keys re-recorded by this process
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest()[:32] + '.json')
+
+    def _load(self, key: str) -> list:
+        if key not in self._cache:
+            try:
+                with open(self._path(key), encoding='utf-8') as f:
+                    self._cache[key] = json.load(f)['interactions']
+            except (OSError, ValueError, KeyError):
+                self._cache[key] = []
+        return self._cache[key]
+
+    def next(self, key: str):
+        """The next recorded interaction for this key, or None if there is none."""
+        with self._lock:
+            interactions = self._load(key)
+            if not interactions:
+                return None
+            index = self._replayed.get(key, 0)
+            self._replayed[key] = index + 1
+            return interactions[index % len(interactions)]
+
+    def record(self, key: str, interaction: dict):
+        """
+        Save an interaction. The first recording of a key in this process
+        replaces whatever an earlier session stored for it.
+        """
+        with self._lock:
+            if key in self._recorded:
+                interactions = self._load(key)
+            else:
+                interactions = self._cache[key] = []
+                self._recorded.add(key)
+            interactions.append(interaction)
+
+            os.makedirs(self.directory, exist_ok=True)
+            # Write atomically so concurrent workers never read a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'request': key, 'interactions': interactions}, f, indent=2)
+            os.replace(tmp_path, self._path(key))
+
+
+class CassetteResponse:
+    """
+    A fully read response, standing in for aiohttp.ClientResponse. Supports
+    what the agents use: status, headers, url, read(), text() and json().
+    """
+
+    def __init__(self, method: str, url: str, status: int, headers: list, body: bytes):
+        self.method = method
+        self.url = URL(url)
+        self.status = status
+        self.headers = CIMultiDictProxy(CIMultiDict(headers))
+        self._body = body
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: str = None) -> str:
+        return self._body.decode(encoding or 'utf-8', errors='replace')
+
+    async def json(self, encoding: str = None, loads=json.loads, content_type: str = 'application/json'):
+        text = self._body.decode(encoding or 'utf-8')
+        return loads(text) if text.strip() else None
+
+    def raise_for_status(self):
+        if not self.ok:
+            raise aiohttp.ClientResponseError(
+                aiohttp.RequestInfo(self.url, self.method, self.headers, self.url),
+                (),
+                status=self.status,
+                headers=self.headers
+            )
+
+    def release(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+class _RequestContext:
+    """Lets session.get(...) be awaited or used with async with, like aiohttp."""
+
+    def __init__(self, coro):
+        self._coro = coro
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    async def __aenter__(self):
+        return await self._coro
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+class CassetteSession:
+    """
+    Drop-in replacement for the shared aiohttp.ClientSession that records or
+    replays every request. In record mode the real session does the work; in
+    replay mode nothing touches the network and each response arrives after
+    its recorded duration times HTTP_CASSETTE_TIME_SCALE. Recorded timeouts and
+    connection errors are replayed as well. A request that was never recorded
+    fails with aiohttp.ClientConnectionError, like an unreachable host.
+    """
+
+    def __init__(self, mode: str, store: CassetteStore, session: aiohttp.ClientSession = None,
+                 time_scale: float = 1.0, default_timeout: aiohttp.ClientTimeout = None):
+        self.mode = mode
+        self.store = store
+        self.session = session
+        self.time_scale = time_scale
+        self.timeout = default_timeout or (session.timeout if session else aiohttp.ClientTimeout())
+        self._closed = False
+
+    @property
+    def closed(self) -> bool:
+        return self._closed or (self.session is not None and self.session.closed)
+
+    async def close(self):
+        self._closed = True
+        if self.session is not None:
+            await self.session.close()
+
+    def request(self, method: str, url, **kwargs) -> _RequestContext:
+        if self.mode == 'record':
+            return _RequestContext(self._record(method, url, **kwargs))
+        return _RequestContext(self._replay(method, url, **kwargs))
+
+    def get(self, url, **kwargs) -> _RequestContext:
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs) -> _RequestContext:
+        return self.request('HEAD', url, **kwargs)
+
+    def post(self, url, **kwargs) -> _RequestContext:
+        return self.request('POST', url, **kwargs)
+
+    async def _record(self, method: str, url, **kwargs) -> CassetteResponse:
+        key = request_key(method, url, kwargs.get('params'))
+        started = time.perf_counter()
+
+        try:
+            async with self.session.request(method, url, **kwargs) as response:
+                body = await response.read()
+                status = response.status
+                headers = [(name, value) for name, value in response.headers.items() if name.lower() != 'set-cookie']
+                final_url = redact(response.url)
+        except asyncio.TimeoutError:
+            self.store.record(key, {'error': 'timeout', 'elapsed': time.perf_counter() - started})
+            raise
+        except aiohttp.ClientConnectionError as e:
+            self.store.record(key, {'error': 'connection', 'message': str(e), 'elapsed': time.perf_counter() - started})
+            raise
+
+        self.store.record(key, {
+            'status': status,
+            'url': final_url,
+            'headers': headers,
+            'body': base64.b64encode(body).decode('ascii'),
+            'elapsed': time.perf_counter() - started
+        })
+        return CassetteResponse(method, final_url, status, headers, body)
+
+    async def _replay(self, method: str, url, **kwargs) -> CassetteResponse:
+        key = request_key(method, url, kwargs.get('params'))
+        # Replay never reaches aiohttp's tracing hooks, so trace and count it here
+        host = URL(str(url)).host
+        span = start_span(f'{method.upper()} {host}', HTTP, **{
+            'http.method': method.upper(), 'http.url': str(URL(str(url)).with_query(None)), 'cassette': 'replay'
+        })
+        started = time.perf_counter()
+        try:
+            response = await self._replay_interaction(key, method, url, **kwargs)
+        except BaseException as e:
+            record_upstream(host, type(e).__name__, time.perf_counter() - started)
+            span.end(e)
+            raise
+        record_upstream(host, response.status, time.perf_counter() - started)
+        span.set(**{'http.status_code': response.status})
+        span.end()
+        return response
+
+    async def _replay_interaction(self, key: str, method: str, url, **kwargs) -> CassetteResponse:
+        interaction = self.store.next(key)
+        if interaction is None:
+            raise aiohttp.ClientConnectionError(f'No recorded response for {key}')
+
+        delay = interaction.get('elapsed', 0) * self.time_scale
+        limit = (kwargs.get('timeout') or self.timeout).total
+        if limit is not None and delay > limit:
+            await asyncio.sleep(limit)
+            raise asyncio.TimeoutError()
+        await asyncio.sleep(delay)
+
+        if interaction.get('error') == 'timeout':
+            raise asyncio.TimeoutError()
+        if interaction.get('error') == 'connection':
+            raise aiohttp.ClientConnectionError(interaction.get('message', 'Recorded connection error'))
+
+        return CassetteResponse(
+            method,
+            interaction.get('url', str(url)),
+            interaction['status'],
+            interaction.get('headers', []),
+            base64.b64decode(interaction.get('body', ''))
+        )
+
+
+_store = None
+
+
+def cassette_enabled() -> bool:
+    return HTTP_CASSETTE_MODE in ('record', 'replay')
+
+
+def wrap_session(session: aiohttp.ClientSession = None, default_timeout: aiohttp.ClientTimeout = None) -> CassetteSession:
+    """
+    Wrap the shared session for the configured cassette mode.
+    In replay mode no real session is needed.
+    """
+    global _store
+    if _store is None:
+        _store = CassetteStore(HTTP_CASSETTE_DIR)
+    return CassetteSession(HTTP_CASSETTE_MODE, _store, session, HTTP_CASSETTE_TIME_SCALE, default_timeout)
@@ -1,8 +1,6 @@
-import os
 import json
-import google.generativeai as genai
-
-genai.configure(api_key=os.getenv('GEMINI_API_KEY', ''))
+from agents.llm_client import generate_text
+from agents.metrics import record_parse_failure
 
 
 async def chat_agent(user_message: str, current_trip: dict) -> dict:
@@ -59,18 +57,13 @@ Examples:
 
 Be conversational and helpful. If unclear, ask for clarification."""
 
-    generation_config = genai.types.GenerationConfig(
+    text = await generate_text(
+        prompt,
         temperature=0.7,
         max_output_tokens=2048,
+        task='chat'
     )
-
-    model = genai.GenerativeModel(
-        'models/gemini-2.5-flash',
-        generation_config=generation_config
-    )
-
-    response = model.generate_content(prompt)
-    text = response.text.strip()
+    text = text.strip()
 
     # Clean markdown if present
     text = text.replace('```json', '').replace('```', '').strip()
@@ -81,6 +74,7 @@ Be conversational and helpful. If unclear, ask for clarification."""
         return chat_response
     except json.JSONDecodeError as e:
         print(f"✗ JSON decode error in chat agent: {e}")
+        record_parse_failure('chat', 'invalid')
         # Return a fallback response
         return {
             'response': "I understand you'd like to make some changes. Could you provide more specific details about what you'd like to modify?",
@@ -0,0 +1,96 @@
+import asyncio
+from agents.http_client import get_session
+from agents.map_agent import extract_attractions, geocode_attraction, geocode_context, map_entries
+from agents.name_cache import extract_attraction_names
+from agents.wiki_agent import activity_strings, apply_wikipedia_links, link_candidates, resolve_titles
+
+
+class DayNames:
+    """
+    Attraction names extracted from itinerary days as they stream in, so the
+    NLP work overlaps generation and only the Wikipedia lookup is left once
+    the whole itinerary is there. Whoever starts days must call cancel() when
+    done with them, whether or not the itinerary was ever enriched.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+
+    def start(self, day_key: str, day: dict):
+        """Start extracting a day's names, replacing a previous version of the day."""
+        previous = self._tasks.get(day_key)
+        if previous is not None:
+            previous.cancel()
+
+        task = asyncio.ensure_future(self._extract(day_key, day))
+        # Retrieve failures so they aren't reported as never retrieved;
+        # collect() leaves those days to be extracted again
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._tasks[day_key] = task
+
+    @staticmethod
+    async def _extract(day_key: str, day: dict) -> dict:
+        activities = activity_strings({day_key: day})
+        return dict(zip(activities, await extract_attraction_names(activities)))
+
+    async def collect(self) -> dict:
+        """{activity: name} from every day that was extracted successfully."""
+        tasks = list(self._tasks.values())
+        if tasks:
+            await asyncio.wait(tasks)
+
+        names = {}
+        for task in tasks:
+            if not task.cancelled() and task.exception() is None:
+                names.update(task.result())
+        return names
+
+    def cancel(self):
+        for task in self._tasks.values():
+            task.cancel()
+
+
+async def enrich_itinerary(country: str, itinerary: dict, locations: str = None, day_names: DayNames = None) -> dict:
+    """
+    Add Wikipedia links to the itinerary and geocode its attractions for the
+    map in one pass. Each activity's names are extracted once, the Wikipedia
+    titles of both the itinerary and the map pins go out in one batched
+    lookup, and geocoding runs alongside it.
+
+    day_names holds names already extracted from days streamed in while the
+    itinerary was generated; activities it doesn't cover (e.g. days changed
+    after streaming) are extracted here.
+    Returns {'itinerary': linked itinerary, 'mapData': geocoded attractions}.
+    """
+    try:
+        if 'raw' in itinerary:
+            return {'itinerary': itinerary, 'mapData': []}
+
+        session = get_session()
+        places = extract_attractions(itinerary)
+
+        async def link():
+            activities = activity_strings(itinerary)
+            names = await day_names.collect() if day_names is not None else {}
+            missing = [activity for activity in activities if activity not in names]
+            names.update(zip(missing, await extract_attraction_names(missing)))
+
+            candidates, titles = link_candidates(itinerary, names)
+            links = await resolve_titles(titles + places, session)
+            return apply_wikipedia_links(itinerary, candidates, links), links
+
+        async def geocode():
+            context = geocode_context(country, locations)
+            return await asyncio.gather(*(geocode_attraction(session, name, context) for name in places))
+
+        if places:
+            print(f'Geocoding {len(places)} attractions from itinerary...')
+        (linked, links), coordinates = await asyncio.gather(link(), geocode())
+
+        map_data = map_entries(places, coordinates, links)
+        print(f'Successfully geocoded {len(map_data)} attractions')
+        return {'itinerary': linked, 'mapData': map_data}
+
+    finally:
+        if day_names is not None:
+            day_names.cancel()
@@ -0,0 +1,196 @@
+import re
+import functools
+import threading
+import spacy
+from agents.gazetteer import Gazetteer, landmark_span
+
+# Attraction-name extraction from activity descriptions. Kept free of the
+# web-facing agent code so NLP worker processes (nlp_worker.py) can import it
+# without starting caches, HTTP sessions or metrics.
+
+# Only doc.ents (ner) and token.pos_ (tagger + attribute_ruler) are used, so the
+# dependency parser and lemmatizer are left out of the pipeline
+SPACY_MODEL = 'en_core_web_sm'
+SPACY_EXCLUDE = ['parser', 'lemmatizer']
+SPACY_BATCH_SIZE = 64  # Activities per nlp.pipe batch
+
+# Names ending in one of these are taken as landmarks ("Senso-ji Temple")
+LANDMARKS = Gazetteer([
+    'Temple', 'Shrine', 'Museum', 'Tower', 'Palace', 'Castle', 'Park', 'Garden', 'Gardens', 'Square',
+    'Market', 'Building', 'Hills', 'Observatory', 'Crossing', 'Street', 'Gate', 'Hall', 'Center', 'Centre',
+    'District', 'Skytree', 'Bridge', 'River', 'Station', 'Memorial', 'Statue', 'Theatre', 'Island', 'Kitchen'
+])
+
+# Capitalized phrases starting with one of these describe an activity, not a place
+ACTION_VERBS = frozenset([
+    'Take', 'Visit', 'Explore', 'Enjoy', 'Experience', 'Discover', 'Wander', 'Stroll', 'Ascend', 'Relax',
+    'Browse', 'Witness', 'Find', 'Dive', 'Immerse', 'Have', 'Walk'
+])
+
+# A capital letter and everything after it that a place name can contain
+NAME_SPAN = re.compile(r"[A-Z][\w'\s-]*")
+# "of/in/at/to [Place]"
+CONTEXT_PLACE = re.compile(r"(?:of|in|at|from|to)\s+(?:the\s+)?([A-Z][\w'\s-]+)")
+CONTEXT_TRAILING_WORDS = re.compile(r'\s+(?:and\s+[a-z].*|area|region)$', re.IGNORECASE)
+# 2-5 capitalized words, including apostrophes
+PROPER_NOUN_PHRASE = re.compile(r"[A-Z][\w']+(?:\s+[A-Z][\w']+){1,4}")
+
+nlp = None
+_nlp_loaded = False
+_nlp_lock = threading.Lock()
+
+
+def get_nlp():
+    """
+    The spaCy pipeline for POS tagging and NER, loaded on first use.
+    None if the model is not installed.
+    """
+    global nlp, _nlp_loaded
+
+    if not _nlp_loaded:
+        with _nlp_lock:
+            if not _nlp_loaded:
+                try:
+                    nlp = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDE)
+                except OSError:
+                    # Fallback if model not installed
+                    nlp = None
+                _nlp_loaded = True
+    return nlp
+
+
+def spacy_available() -> bool:
+    """Whether the model is installed, without loading it."""
+    return nlp is not None if _nlp_loaded else spacy.util.is_package(SPACY_MODEL)
+
+
+@functools.lru_cache(maxsize=None)
+def spacy_model_version() -> str:
+    """Version of the installed model package, or None if it is not installed."""
+    return spacy.util.get_package_version(SPACY_MODEL)
+
+
+# Skip common company/service provider names that shouldn't be hyperlinked
+SKIP_COMPANIES = {
+    'budget', 'hertz', 'avis', 'enterprise', 'thrifty', 'national', 'alamo', 'dollar', 'sixt',
+    'marriott', 'hilton', 'hyatt', 'sheraton', 'holiday inn', 'best western', 'radisson',
+    'airbnb', 'booking.com', 'expedia', 'hotels.com', 'tripadvisor',
+    'uber', 'lyft', 'grab', 'ola', 'bolt',
+    'mcdonald', 'starbucks', 'kfc', 'subway', 'pizza hut', 'domino',
+    'walmart', 'target', 'costco', 'tesco', 'carrefour'
+}
+
+
+def extract_attraction_name(activity: str) -> str:
+    """
+    Extract attraction name from activity description using spaCy NER to capture full entity names.
+    """
+    nlp = get_nlp()
+    if not nlp:
+        # Fallback to regex if spaCy not available
+        return extract_attraction_name_regex(activity)
+
+    return attraction_name_from_doc(nlp(activity), activity)
+
+
+def extract_attraction_names(activities: list) -> list:
+    """
+    Extract attraction names for many activities in one call, in the same order
+    (None where nothing was found). spaCy processes them in batches, which is
+    much faster than one nlp() call per string.
+    """
+    nlp = get_nlp()
+    if not nlp:
+        return [extract_attraction_name_regex(activity) for activity in activities]
+
+    docs = nlp.pipe(activities, batch_size=SPACY_BATCH_SIZE)
+    return [attraction_name_from_doc(doc, activity) for activity, doc in zip(activities, docs)]
+
+
+def attraction_name_from_doc(doc, activity: str) -> str:
+    """
+    Pick the attraction name out of an activity's spaCy doc.
+    """
+    # First, try to find named entities (GPE, LOC, FAC, ORG)
+    # These are proper nouns that spaCy recognizes as places/landmarks
+    candidates = []
+
+    for ent in doc.ents:
+        # Look for location-related entities
+        if ent.label_ in ['GPE', 'LOC', 'FAC', 'ORG', 'PERSON']:
+            text = ent.text.strip()
+            # Skip if it's a known company/service provider
+            if text.lower() in SKIP_COMPANIES:
+                continue
+            # Filter out common non-landmark words
+            if len(text) > 3 and len(text) < 60:
+                # Skip if it's just a time or date
+                if ent.label_ not in ['DATE', 'TIME', 'CARDINAL', 'ORDINAL']:
+                    candidates.append((text, ent.start_char, ent.label_))
+
+    # If we found entities, prefer FAC > LOC > GPE > ORG
+    if candidates:
+        # Sort by priority (FAC first, then LOC, GPE, ORG, PERSON last)
+        priority = {'FAC': 0, 'LOC': 1, 'GPE': 2, 'ORG': 3, 'PERSON': 4}
+        candidates.sort(key=lambda x: (priority.get(x[2], 10), x[1]))
+        return candidates[0][0]
+
+    # If no entities found, look for consecutive proper nouns
+    # This catches cases like "Hell's Kitchen" that might not be recognized as entities
+    proper_nouns = []
+    current_phrase = []
+
+    for token in doc:
+        if token.pos_ == 'PROPN':
+            current_phrase.append(token.text)
+        else:
+            if current_phrase:
+                phrase = ' '.join(current_phrase)
+                # Skip if it's a known company/service provider
+                if phrase.lower() in SKIP_COMPANIES:
+                    current_phrase = []
+                    continue
+                # Skip action verbs at the start
+                if phrase not in ACTION_VERBS and len(phrase) > 3:
+                    proper_nouns.append(phrase)
+                current_phrase = []
+
+    # Don't forget the last phrase if sentence ends with proper nouns
+    if current_phrase:
+        phrase = ' '.join(current_phrase)
+        if len(phrase) > 3:
+            proper_nouns.append(phrase)
+
+    # Return the first valid proper noun phrase
+    if proper_nouns:
+        return proper_nouns[0]
+
+    # Final fallback to regex-based extraction
+    return extract_attraction_name_regex(activity)
+
+
+def extract_attraction_name_regex(activity: str) -> str:
+    """
+    Fallback regex-based extraction when spaCy is not available or doesn't find entities.
+    """
+    # Pattern 1: Look for landmark names with specific suffixes
+    place = landmark_span(activity, NAME_SPAN, LANDMARKS)
+    if place and 4 < len(place) < 60:
+        return place
+
+    # Pattern 2: Look for "of/in/at/to [Place]" patterns
+    context_match = CONTEXT_PLACE.search(activity)
+    if context_match:
+        place = context_match.group(1).strip()
+        # Clean up trailing words
+        place = CONTEXT_TRAILING_WORDS.sub('', place)
+        if len(place) > 3 and len(place) < 60:
+            return place
+
+    # Pattern 3: Match proper noun phrases, skipping ones that start with a verb
+    for match in PROPER_NOUN_PHRASE.finditer(activity):
+        place = match.group()
+        if place.split()[0] not in ACTION_VERBS and 5 < len(place) < 60:
+            return place
+
+    return None
@@ -0,0 +1,50 @@
+import re
+
+# Keyword lists for the rule-based place extractors (extraction.py and
+# map_agent.py), each compiled once into a single pattern instead of being
+# spelled out as alternations inside regexes that are looked up on every call.
+
+
+class Gazetteer:
+    """
+    A keyword list compiled into one pattern, so a single pass of the regex
+    engine finds whichever keyword occurs first. The pattern is the keywords
+    followed by the optional `after` regex. When several keywords match at the
+    same position the one listed first wins, as in a regex alternation.
+    """
+
+    def __init__(self, keywords, after: str = '', ignore_case: bool = False):
+        self.keywords = tuple(keywords)
+        self.alternation = '(?:' + '|'.join(map(re.escape, self.keywords)) + ')'
+        self.pattern = re.compile(self.alternation + after, re.IGNORECASE if ignore_case else 0)
+
+    def search(self, text: str, start: int = 0, end: int = None):
+        """First match in text[start:end], or None."""
+        return self.pattern.search(text, start, len(text) if end is None else end)
+
+    def strip_prefix(self, text: str) -> str:
+        """text without a match at its start: "Visit the Gion District" -> "Gion District"."""
+        match = self.pattern.match(text)
+        return text[match.end():] if match else text
+
+
+def landmark_span(text: str, spans, landmarks: Gazetteer, anchored: bool = False) -> str:
+    """
+    The first span that starts at a capital letter and runs to the nearest
+    landmark keyword after it, e.g. "Visit the Senso-ji Temple, Tokyo" ->
+    "Senso-ji Temple". spans matches a capital letter and everything after it
+    up to the next character a name can't contain. With anchored the span must
+    start at the beginning of the text. Returns None if there is no such span.
+
+    Each span is searched for keywords once, rather than trying every keyword
+    at every character as a lazy "[A-Z].+?(?:Temple|...)" pattern does.
+    """
+    candidates = [spans.match(text)] if anchored else spans.finditer(text)
+    for span in candidates:
+        if span is None:
+            break
+        # Starting at the first capital of the span gives the longest name
+        landmark = landmarks.search(text, span.start() + 1, span.end())
+        if landmark:
+            return text[span.start():landmark.end()]
+    return None
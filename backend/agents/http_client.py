@@ -0,0 +1,71 @@
+import os
+import asyncio
+import weakref
+import aiohttp
+from agents.cassette import HTTP_CASSETTE_MODE, cassette_enabled, wrap_session
+from agents.metrics import http_metrics_config
+from agents.tracing import http_trace_config
+
+# Connection pool settings shared by every external-API agent
+HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', 100))  # Total open connections
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', 10))  # Per upstream host
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', 300))  # Seconds
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 30))  # Idle seconds before closing
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', 10))  # Default per-request timeout
+
+USER_AGENT = 'AI-Travel-Planner/1.0 (Educational Project)'
+
+# aiohttp sessions are bound to the loop that created them, so keep one per loop.
+# In the server that is exactly one per worker process (see event_loop.py).
+_sessions = weakref.WeakKeyDictionary()
+
+
+def timeout(seconds: float) -> aiohttp.ClientTimeout:
+    """
+    Per-request timeout, for calls that need a tighter limit than the default.
+    """
+    return aiohttp.ClientTimeout(total=seconds)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Return the shared HTTP session for the running event loop, creating it on first use.
+    Connections are kept alive and DNS lookups cached across requests.
+    With HTTP_CASSETTE_MODE set, the session records or replays traffic (see cassette.py).
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+
+    if session is None or session.closed:
+        if HTTP_CASSETTE_MODE == 'replay':
+            # Replay never touches the network, so there is no real session behind it
+            session = wrap_session(default_timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT))
+            _sessions[loop] = session
+            return session
+
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT),
+            headers={'User-Agent': USER_AGENT},
+            trace_configs=[http_trace_config(), http_metrics_config()]
+        )
+        if cassette_enabled():
+            session = wrap_session(session)
+        _sessions[loop] = session
+
+    return session
+
+
+async def close_session():
+    """
+    Close the shared session for the running event loop, if there is one.
+    """
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
@@ -1,12 +1,18 @@
 import os
-import re
 import json
-import google.generativeai as genai
+import asyncio
+from agents.llm_client import generate_text, stream_text, is_json_response
+from agents.json_stream import IncrementalObjectParser
+from agents.metrics import record_parse_failure
 
-genai.configure(api_key=os.getenv('GEMINI_API_KEY', ''))
+# Long trips overflow max_output_tokens in a single call, so they are planned
+# as a route skeleton first and then generated in parallel day ranges
+SEGMENTED_MIN_DAYS = int(os.getenv('ITINERARY_SEGMENTED_MIN_DAYS', 10))
+SEGMENTED_MIN_DAYS_COMPREHENSIVE = int(os.getenv('ITINERARY_SEGMENTED_MIN_DAYS_COMPREHENSIVE', 7))
+SEGMENT_DAYS = int(os.getenv('ITINERARY_SEGMENT_DAYS', 4))
 
 
-async def itinerary_agent(country: str, locations: str = None, days: int = 3, origin: str = '', additional_details: str = None, detail_level: str = 'standard') -> dict:
+async def itinerary_agent(country: str, locations: str = None, days: int = 3, origin: str = '', additional_details: str = None, detail_level: str = 'standard', on_day=None) -> dict:
     """
     Generate a travel itinerary using Google Gemini AI.
     Args:
@@ -16,6 +22,7 @@ async def itinerary_agent(country: str, locations: str = None, days: int = 3, or
         origin: Departure city
         additional_details: User preferences and requirements
         detail_level: Level of detail - 'quick', 'standard', or 'comprehensive'
+        on_day: Optional callback(day_key, day) called as soon as each day has been generated
     """
     # Determine activity count and detail based on detail_level
     if detail_level == 'quick':
@@ -142,6 +149,24 @@ ACTIVITY BALANCING - CREATE A WELL-PACED DAY:
    - {detail_instruction}
 """
 
+    if use_segmented_generation(days, detail_level):
+        streamed = set()
+
+        def forward_day(day_key, day):
+            streamed.add(day_key)
+            on_day(day_key, day)
+
+        itinerary = await segmented_itinerary(country, destination, location_list, int(days), origin,
+                                              additional_details, activity_balance_instructions,
+                                              additional_context, forward_day if on_day else None)
+        if itinerary:
+            return itinerary
+        print('⚠ Segmented generation failed, falling back to a single request')
+        if streamed:
+            # The caller has already shown days from the failed attempt; rather
+            # than send a second, different set, leave it to the final itinerary
+            on_day = None
+
     if prompt_mode == 'country_explore':
         prompt = f"""Create a {days}-day travel itinerary for {country}.
 
@@ -296,47 +321,287 @@ Return ONLY valid JSON with keys 'day1', 'day2', etc. Example:
 
     # Configure model for faster response with reasonable quality
     # For large custom itineraries, we need more tokens
-    generation_config = genai.types.GenerationConfig(
-        temperature=0.7,
+    # Stream the response so each day is available as soon as it is generated
+    itinerary, complete, text, parse_error = await generate_days(
+        prompt,
         max_output_tokens=8192,  # Increased for detailed multi-day itineraries with custom preferences
+        on_day=on_day
     )
 
-    model = genai.GenerativeModel(
-        'models/gemini-2.5-flash',
-        generation_config=generation_config
-    )
+    if complete:
+        return itinerary
+
+    print(f"JSON decode error: {parse_error or 'response ended before the itinerary was complete'}")
+    print(f"Response length: {len(text)} characters")
+
+    # Check if response was likely truncated
+    if len(text) > 7000 and not text.rstrip().endswith('}'):
+        print("WARNING: Response appears to be truncated. Consider increasing max_output_tokens.")
+
+    # Salvage every day that was completed before the response broke off
+    if itinerary:
+        print(f"Salvaged {len(itinerary)} complete day(s) from partial response")
+        return itinerary
+
+    print(f"Could not parse response. First 500 chars: {text[:500]}")
+    return {'raw': text, 'error': 'Failed to parse itinerary response'}
+
+
+async def generate_days(prompt: str, max_output_tokens: int = 8192, on_day=None) -> tuple:
+    """
+    Stream an itinerary response and parse each dayN entry as soon as it is complete.
+    Returns (days, complete, raw_text, parse_error).
+    """
+    parser = IncrementalObjectParser()
+    itinerary = {}
+    parse_error = None
+
+    async for chunk in stream_text(
+        prompt,
+        temperature=0.7,
+        max_output_tokens=max_output_tokens,
+        use_cache=True,
+        cache_if=is_json_response,
+        task='itinerary'
+    ):
+        if parse_error:
+            continue
+        try:
+            for day_key, day in parser.feed(chunk):
+                itinerary[day_key] = day
+                if on_day:
+                    on_day(day_key, day)
+        except ValueError as e:
+            parse_error = e
+
+    if parse_error:
+        record_parse_failure('itinerary', 'invalid')
+    elif not parser.complete:
+        record_parse_failure('itinerary', 'truncated')
+
+    return itinerary, parser.complete and not parse_error, parser.text.strip(), parse_error
+
+
+def use_segmented_generation(days, detail_level: str) -> bool:
+    """
+    Whether a trip is long enough to risk hitting the output token limit in one call.
+    """
+    try:
+        days = int(days)
+    except (TypeError, ValueError):
+        return False
+
+    if detail_level == 'comprehensive':
+        return days >= SEGMENTED_MIN_DAYS_COMPREHENSIVE
+    return days >= SEGMENTED_MIN_DAYS
+
+
+async def plan_route(country: str, destination: str, location_list: list, days: int, additional_details: str) -> dict:
+    """
+    Ask the LLM for a short route skeleton: which city/area the traveler is based in each day.
+    Returns {'day1': 'Tokyo', ...} or None if the request failed or the skeleton is unusable.
+    """
+    if location_list and len(location_list) == 1:
+        # Single city: nothing to plan
+        return {f'day{n}': location_list[0] for n in range(1, days + 1)}
+
+    if location_list:
+        city_instructions = f"""The traveler wants to visit: {', '.join(location_list)}
+Allocate days proportionally and visit them in a logical geographic order to minimize travel time."""
+    else:
+        city_instructions = f"""Select 1-{min(4, (days // 2) + 1)} cities/regions in {country} that best showcase the country.
+Consider the {days}-day duration (longer trips = more cities) and plan a logical geographic route."""
 
-    response = model.generate_content(prompt)
-    text = response.text
+    reservations = ""
+    if additional_details and additional_details.strip():
+        reservations = f"""
+
+The traveler has existing reservations. Base each day where these require:
+{additional_details}"""
+
+    prompt = f"""Plan the route for a {days}-day trip to {destination}.
+
+{city_instructions}
+Group consecutive days in the same city together.{reservations}
 
-    # Remove markdown code blocks if present
-    text = re.sub(r'```json\n?', '', text)
-    text = re.sub(r'```\n?', '', text)
-    text = text.strip()
+Return ONLY valid JSON mapping every day to the city/area the traveler is based in that day,
+with keys 'day1' to 'day{days}'. Example:
+{{"day1": "Tokyo", "day2": "Tokyo", "day3": "Kyoto"}}"""
 
-    # Try to parse JSON; fallback to raw text
     try:
-        return json.loads(text)
+        text = await generate_text(
+            prompt,
+            temperature=0.4,
+            max_output_tokens=1024,
+            use_cache=True,
+            cache_if=is_json_response,
+            task='route'
+        )
+    except Exception as e:
+        print(f"✗ Could not plan route skeleton: {e}")
+        return None
+    text = text.replace('```json', '').replace('```', '').strip()
+
+    try:
+        route = json.loads(text)
     except json.JSONDecodeError as e:
-        print(f"JSON decode error: {e}")
-        print(f"Response length: {len(text)} characters")
+        print(f"✗ Could not parse route skeleton: {e}")
+        record_parse_failure('route', 'invalid')
+        return None
+
+    expected = [f'day{n}' for n in range(1, days + 1)]
+    if not isinstance(route, dict) or not all(isinstance(route.get(key), str) and route[key].strip() for key in expected):
+        print(f"✗ Route skeleton does not cover all {days} days")
+        return None
+
+    return {key: route[key].strip() for key in expected}
+
+
+def build_segment_prompt(destination: str, route: dict, start: int, end: int, days: int, origin: str,
+                         activity_balance_instructions: str, additional_context: str) -> str:
+    """
+    Prompt for generating days start..end of a longer trip that follows a fixed route.
+    """
+    route_lines = '\n'.join(f"- day{n}: {route[f'day{n}']}" for n in range(start, end + 1))
+
+    previous_note = ""
+    if start > 1:
+        previous_note = f"\nOn day{start - 1} the traveler was in {route[f'day{start - 1}']}."
+
+    # Transportation belongs exactly on the days where the city changes
+    travel_days = [
+        f"day{n} ({route[f'day{n - 1}']} to {route[f'day{n}']})"
+        for n in range(max(start, 2), end + 1)
+        if route[f'day{n}'] != route[f'day{n - 1}']
+    ]
+    if travel_days:
+        transportation_rule = f"ONLY on these days, where the traveler moves to a new city: {', '.join(travel_days)}"
+    else:
+        transportation_rule = "Do NOT include transportation on any of these days (no city changes)"
+
+    return f"""Create days {start} to {end} of a {days}-day travel itinerary for {destination}.
+Other days are planned separately, so cover ONLY day{start} through day{end}.
+
+FOLLOW THIS ROUTE EXACTLY (city/area for each day):
+{route_lines}{previous_note}
 
-        # Check if response was likely truncated
-        if len(text) > 7000 and not text.rstrip().endswith('}'):
-            print("WARNING: Response appears to be truncated. Consider increasing max_output_tokens.")
+{activity_balance_instructions}
+
+Format each time period (morning, afternoon, evening) as an ARRAY of activities.
+Each activity should be descriptive and actionable (e.g., "Visit the Sky Tower observation deck for 360-degree city views").
+
+For each day, provide:
+- location: The city/area for this day, exactly as given in the route
+- morning: Array of detailed morning activities
+- afternoon: Array of detailed afternoon activities
+- evening: Array of detailed evening activities
+- food_recommendation: A specific local dish or restaurant recommendation with brief description
+- cultural_highlight: An interesting cultural fact, tradition, or must-see cultural site with context
+- transportation: {transportation_rule}. Object with: {{ method, duration, cost_local, cost_origin, travel_note }}
+  * cost_local should show local currency with proper symbol (e.g., "NZD $150-250")
+  * cost_origin should show {origin} currency conversion (e.g., "$95-160 USD")
+
+Return ONLY valid JSON with keys 'day{start}' to 'day{end}'.{additional_context}"""
+
+
+def stitch_segments(route: dict, segments: list) -> dict:
+    """
+    Merge segment results into one dayN map in day order.
+    Locations follow the route, and transportation appears exactly on the days
+    where the city changes.
+    """
+    generated = {}
+    for segment in segments:
+        generated.update(segment)
+
+    itinerary = {}
+    previous_location = None
+
+    for n in range(1, len(route) + 1):
+        day_key = f'day{n}'
+        day = generated.get(day_key)
+        if not isinstance(day, dict):
+            print(f"⚠ {day_key} missing from segmented itinerary")
+            previous_location = route[day_key]
+            continue
+
+        day = {**day, 'location': route[day_key]}
+
+        if previous_location is None or route[day_key] == previous_location:
+            day.pop('transportation', None)
+        elif not isinstance(day.get('transportation'), dict):
+            day['transportation'] = {
+                'method': 'See local options',
+                'duration': '',
+                'cost_local': '',
+                'cost_origin': '',
+                'travel_note': f"Travel from {previous_location} to {route[day_key]}"
+            }
+
+        itinerary[day_key] = day
+        previous_location = route[day_key]
+
+    return itinerary
+
+
+async def segmented_itinerary(country: str, destination: str, location_list: list, days: int, origin: str,
+                              additional_details: str, activity_balance_instructions: str,
+                              additional_context: str, on_day=None) -> dict:
+    """
+    Generate a long itinerary as a route skeleton plus day ranges generated in parallel.
+    Latency is bounded by the slowest segment rather than the whole trip.
+    A segment whose request fails is retried once on its own.
+    Returns None if the route skeleton could not be planned or a segment
+    failed twice.
+    """
+    route = await plan_route(country, destination, location_list, days, additional_details)
+    if not route:
+        return None
+
+    ranges = [(start, min(start + SEGMENT_DAYS - 1, days)) for start in range(1, days + 1, SEGMENT_DAYS)]
+    print(f"🧩 Generating {days}-day itinerary in {len(ranges)} parallel segments")
+
+    async def generate_segment(start: int, end: int):
+        """
+        generate_days for one day range, keeping only the days in that range.
+        Returns the exception instead if the request failed, so one segment's
+        provider error doesn't throw away the others.
+        """
+        segment_days = {f'day{n}' for n in range(start, end + 1)}
+
+        def forward_day(day_key, day):
+            # Keep the streamed day consistent with the route before handing it on
+            if on_day and day_key in segment_days and isinstance(day, dict):
+                on_day(day_key, {**day, 'location': route.get(day_key, day.get('location'))})
 
-        # Try to find where valid JSON ends
-        # Sometimes we can salvage partial JSON
         try:
-            # Find the last complete day entry
-            last_day_match = re.search(r'"day\d+":\s*\{[^}]*\}', text)
-            if last_day_match:
-                # Try to construct valid JSON from what we have
-                truncated_point = last_day_match.end()
-                salvaged_text = text[:truncated_point] + '\n}'
-                return json.loads(salvaged_text)
-        except:
-            pass
-
-        print(f"Could not parse response. First 500 chars: {text[:500]}")
-        return {'raw': text, 'error': 'Failed to parse itinerary response'}
+            generated, complete, raw_text, parse_error = await generate_days(
+                build_segment_prompt(destination, route, start, end, days, origin,
+                                     activity_balance_instructions, additional_context),
+                max_output_tokens=8192,
+                on_day=forward_day
+            )
+        except Exception as e:
+            return e
+        return {k: v for k, v in generated.items() if k in segment_days}, complete, raw_text, parse_error
+
+    results = await asyncio.gather(*[generate_segment(start, end) for start, end in ranges])
+
+    # Retry failed segments once, keeping the ones that succeeded
+    failed = [i for i, result in enumerate(results) if isinstance(result, Exception)]
+    if failed:
+        for i in failed:
+            print(f"⚠ Segment day{ranges[i][0]}-day{ranges[i][1]} failed: {results[i]}, retrying")
+        retried = await asyncio.gather(*[generate_segment(*ranges[i]) for i in failed])
+        for i, result in zip(failed, retried):
+            if isinstance(result, Exception):
+                print(f"⚠ Segment day{ranges[i][0]}-day{ranges[i][1]} failed again: {result}")
+                return None
+            results[i] = result
+
+    for (start, end), (_, complete, _, parse_error) in zip(ranges, results):
+        if not complete:
+            print(f"⚠ Segment day{start}-day{end} incomplete: {parse_error or 'truncated response'}")
+
+    itinerary = stitch_segments(route, [days_generated for days_generated, _, _, _ in results])
+    return itinerary or None
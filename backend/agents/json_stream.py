@@ -0,0 +1,96 @@
+import json
+
+
+class IncrementalObjectParser:
+    """
+    Incrementally parse a streamed JSON object and hand back each top-level
+    member ("day1": {...}) as soon as its value is complete.
+
+    Anything before the opening brace (such as a ```json fence) is ignored.
+    Each character is scanned once, and the buffer only keeps the member still
+    being parsed, so feeding a chunk costs no more as the response grows.
+    """
+
+    def __init__(self):
+        self.chunks = []  # Everything fed so far
+        self.buffer = ''  # Text from the start of the current member on
+        self.pos = 0  # Next character to scan
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.member_start = None  # Where the current top-level member begins
+        self.started = False
+        self.complete = False
+
+    def feed(self, chunk: str) -> list:
+        """
+        Add more text. Returns a list of (key, value) pairs completed by this chunk.
+        Raises ValueError if a completed member is not valid JSON.
+        """
+        if self.complete or not chunk:
+            return []
+
+        self.chunks.append(chunk)
+
+        # Drop text whose members have already been handed back
+        consumed = self.member_start if self.started else self.pos
+        if consumed:
+            self.buffer = self.buffer[consumed:]
+            self.pos -= consumed
+            if self.started:
+                self.member_start = 0
+
+        self.buffer += chunk
+        members = []
+
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+
+            if not self.started:
+                if char == '{':
+                    self.started = True
+                    self.depth = 1
+                    self.member_start = self.pos + 1
+                self.pos += 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    members.extend(self._parse_member(self.pos))
+                    self.complete = True
+                    self.pos += 1
+                    break
+            elif char == ',' and self.depth == 1:
+                members.extend(self._parse_member(self.pos))
+                self.member_start = self.pos + 1
+
+            self.pos += 1
+
+        return members
+
+    def _parse_member(self, end: int) -> list:
+        text = self.buffer[self.member_start:end].strip()
+        if not text:
+            return []
+
+        try:
+            return list(json.loads('{' + text + '}').items())
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid JSON member: {e}') from e
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return ''.join(self.chunks)
@@ -0,0 +1,234 @@
+import os
+import re
+import json
+import asyncio
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from agents.cache_store import INSTANCE_DIR, TieredCache
+from agents.llm_providers import estimate_tokens, get_provider
+from agents.metrics import record_llm_call, record_tokens
+from agents.tracing import LLM, start_span
+
+# Backend selected by LLM_PROVIDER: 'gemini' (default) or 'fake' for load testing
+provider = get_provider()
+
+DEFAULT_MODEL = 'models/gemini-2.5-flash'
+
+# Maximum number of LLM calls in flight at once (across all requests in this process)
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+
+# Per-call timeout in seconds (includes time spent waiting for a free slot)
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 90))
+
+# Response cache for deterministic-enough prompts (itinerary, budget)
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') == '1'
+LLM_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', 512))  # Entries kept in memory
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', 24 * 3600))  # Seconds
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join(INSTANCE_DIR, 'llm_cache.db'))  # Empty for memory only
+
+llm_cache = TieredCache('llm_responses', maxsize=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL, path=LLM_CACHE_PATH or None)
+
+# Provider SDKs are synchronous, so every call runs on this bounded pool.
+# The pool size doubles as the process-wide concurrency limit across all
+# requests and Flask threads.
+_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix='llm')
+
+
+def _generate_sync(prompt: str, model_name: str, temperature: float, max_output_tokens: int, task: str) -> tuple:
+    """
+    Blocking LLM call. Only ever run on the LLM thread pool.
+    Returns (text, usage).
+    """
+    return provider.generate(prompt, model_name, temperature, max_output_tokens, task=task)
+
+
+def _stream_sync(prompt: str, model_name: str, temperature: float, max_output_tokens: int, task: str,
+                 on_chunk, stopped):
+    """
+    Blocking streaming LLM call. Hands each text chunk to on_chunk until
+    the response ends or stopped() says the consumer has gone away.
+    Returns the token usage, if known.
+    """
+    return provider.stream(prompt, model_name, temperature, max_output_tokens, on_chunk, stopped, task=task)
+
+
+def is_json_response(text: str) -> bool:
+    """
+    True if the response parses as JSON once markdown code fences are removed.
+    Used to keep truncated or malformed responses out of the cache.
+    """
+    text = re.sub(r'```(?:json)?', '', text).strip()
+    try:
+        json.loads(text)
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
+def cache_key(prompt: str, model_name: str, temperature: float, max_output_tokens: int) -> str:
+    """
+    Content address of a fully rendered prompt plus its generation config.
+    Includes the provider so fake responses never answer real requests.
+    """
+    payload = json.dumps({
+        'provider': provider.name,
+        'prompt': prompt,
+        'model': model_name,
+        'temperature': temperature,
+        'max_output_tokens': max_output_tokens
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def record_usage(model_name: str, prompt: str, text: str, usage: dict):
+    """Count tokens for a finished call, estimating them if the provider reported none."""
+    if usage:
+        record_tokens(provider.name, model_name, usage['prompt_tokens'] or 0, usage['completion_tokens'] or 0)
+    else:
+        record_tokens(provider.name, model_name, estimate_tokens(prompt), estimate_tokens(text), source='estimated')
+
+
+def llm_span(task: str, model_name: str, stream: bool = False):
+    """Tracing span for one provider call (cache hits are not traced)."""
+    return start_span(f'llm {task or "generate"}', LLM, **{
+        'llm.provider': provider.name,
+        'llm.model': model_name,
+        'llm.stream': stream
+    })
+
+
+async def generate_text(prompt: str, temperature: float = 0.7, max_output_tokens: int = 2048,
+                        model_name: str = DEFAULT_MODEL, timeout: float = None, use_cache: bool = False,
+                        cache_if=None, task: str = None) -> str:
+    """
+    Generate text with the configured LLM provider without blocking the event loop.
+    task ('itinerary', 'route', 'budget', 'chat') tells the fake provider what shape to answer in.
+    With use_cache, identical prompt + config pairs are answered from the response cache;
+    cache_if(text) can veto storing a response (e.g. one that failed to parse).
+    Raises TimeoutError if the call does not finish within the timeout.
+    """
+    timeout = LLM_TIMEOUT if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    if use_cache:
+        key = cache_key(prompt, model_name, temperature, max_output_tokens)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+    span = llm_span(task, model_name)
+    started = time.perf_counter()
+    future = loop.run_in_executor(
+        _executor, _generate_sync, prompt, model_name, temperature, max_output_tokens, task
+    )
+
+    try:
+        text, usage = await asyncio.wait_for(future, timeout=timeout)
+    except asyncio.TimeoutError:
+        # The worker thread keeps running until the provider responds, but the
+        # caller is released and the result is discarded
+        print(f'✗ LLM call timed out after {timeout}s')
+        error = TimeoutError(f'LLM call timed out after {timeout}s')
+        record_llm_call(provider.name, task, 'timeout', time.perf_counter() - started)
+        span.end(error)
+        raise error
+    except BaseException as e:
+        record_llm_call(provider.name, task, 'error', time.perf_counter() - started)
+        span.end(e)
+        raise
+    record_llm_call(provider.name, task, 'ok', time.perf_counter() - started)
+    record_usage(model_name, prompt, text, usage)
+    span.end()
+
+    if use_cache and text and (cache_if is None or cache_if(text)):
+        llm_cache.set(key, text)
+
+    return text
+
+
+async def stream_text(prompt: str, temperature: float = 0.7, max_output_tokens: int = 2048,
+                      model_name: str = DEFAULT_MODEL, timeout: float = None, use_cache: bool = False,
+                      cache_if=None, task: str = None):
+    """
+    Async generator yielding the LLM's response text chunk by chunk as it is produced.
+    Shares the concurrency limit, timeout and response cache of generate_text();
+    a cached response is yielded as a single chunk.
+    Raises TimeoutError if the whole response does not arrive within the timeout.
+    """
+    timeout = LLM_TIMEOUT if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    if use_cache:
+        key = cache_key(prompt, model_name, temperature, max_output_tokens)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    span = llm_span(task, model_name, stream=True)
+    started = time.perf_counter()
+    chunks = asyncio.Queue()
+    consumer_gone = False
+
+    def on_chunk(text):
+        loop.call_soon_threadsafe(chunks.put_nowait, text)
+
+    future = loop.run_in_executor(
+        _executor, _stream_sync, prompt, model_name, temperature, max_output_tokens, task,
+        on_chunk, lambda: consumer_gone
+    )
+
+    def stream_done(done):
+        # Retrieve the SDK's error even if the consumer stopped reading first,
+        # so it isn't reported as never retrieved
+        if not done.cancelled():
+            done.exception()
+        # Wake the consumer when the stream ends, successfully or not
+        chunks.put_nowait(None)
+
+    future.add_done_callback(stream_done)
+
+    deadline = loop.time() + timeout
+    received = []
+    outcome = 'error'
+    error = None
+
+    try:
+        while True:
+            try:
+                text = await asyncio.wait_for(chunks.get(), timeout=max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                print(f'✗ LLM stream timed out after {timeout}s')
+                outcome = 'timeout'
+                raise TimeoutError(f'LLM call timed out after {timeout}s')
+
+            if text is None:
+                break
+            received.append(text)
+            yield text
+
+        # Surface errors raised inside the SDK
+        usage = future.result()
+        outcome = 'ok'
+
+    except (GeneratorExit, asyncio.CancelledError):
+        # The consumer stopped reading
+        outcome = 'cancelled'
+        raise
+    except BaseException as e:
+        error = e
+        raise
+
+    finally:
+        consumer_gone = True
+        record_llm_call(provider.name, task, outcome, time.perf_counter() - started)
+        span.end(error)
+
+    text = ''.join(received)
+    record_usage(model_name, prompt, text, usage)
+
+    if use_cache and text and (cache_if is None or cache_if(text)):
+        llm_cache.set(key, text)
@@ -0,0 +1,300 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for providers that report none."""
+    return max(len(text) // 4, 1) if text else 0
+
+
+def gemini_usage(response):
+    """Token usage from a Gemini response, if this SDK version reports it."""
+    usage = getattr(response, 'usage_metadata', None)
+    if not usage:
+        return None
+    return {'prompt_tokens': usage.prompt_token_count, 'completion_tokens': usage.candidates_token_count}
+
+
+class GeminiProvider:
+    """
+    Google Gemini through the google-generativeai SDK. Calls are blocking and
+    are run on the LLM thread pool by llm_client.
+
+    generate() returns (text, usage) and stream() returns usage, where usage is
+    {'prompt_tokens', 'completion_tokens'} or None if the provider reports none.
+    """
+
+    name = 'gemini'
+
+    def __init__(self):
+        import google.generativeai as genai
+
+        genai.configure(api_key=os.getenv('GEMINI_API_KEY', ''))
+        self.genai = genai
+
+    def _model(self, model_name: str, temperature: float, max_output_tokens: int):
+        generation_config = self.genai.types.GenerationConfig(
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+        )
+
+        return self.genai.GenerativeModel(
+            model_name,
+            generation_config=generation_config
+        )
+
+    def generate(self, prompt: str, model_name: str, temperature: float, max_output_tokens: int, task: str = None) -> tuple:
+        model = self._model(model_name, temperature, max_output_tokens)
+        response = model.generate_content(prompt)
+        return response.text, gemini_usage(response)
+
+    def stream(self, prompt: str, model_name: str, temperature: float, max_output_tokens: int,
+               on_chunk, stopped, task: str = None):
+        """
+        Hand each text chunk to on_chunk until the response ends or stopped() is true.
+        """
+        model = self._model(model_name, temperature, max_output_tokens)
+        usage = None
+        for chunk in model.generate_content(prompt, stream=True):
+            if stopped():
+                return None
+            try:
+                text = chunk.text
+            except ValueError:
+                # Safety and finish chunks carry no text parts
+                text = None
+            if text:
+                on_chunk(text)
+            # The final chunk carries the totals for the whole response
+            usage = gemini_usage(chunk) or usage
+        return usage
+
+
+# Activity templates for the fake backend. They mirror the shape of real
+# responses (landmark names, action verbs, districts) so the enrichment
+# pipeline has realistic work to do.
+FAKE_MORNING = [
+    'Visit the {city} National Museum to see its collection of historic artifacts',
+    'Explore {city} Castle and its surrounding gardens',
+    'Walk through the {city} Central Market for breakfast and local snacks',
+    'Climb {city} Tower for panoramic views of the city'
+]
+FAKE_AFTERNOON = [
+    'Stroll through {city} Botanical Garden',
+    'Discover the historic {city} Old Town district on foot',
+    'See the {city} Memorial Hall and learn about local history',
+    'Browse the shops along {city} Station Street'
+]
+FAKE_EVENING = [
+    'Dinner in the {city} Harbour district',
+    'Night views from the {city} Observatory',
+    'Enjoy street food at the {city} Night Market',
+    'Relax at a riverside cafe near {city} Bridge'
+]
+
+
+class FakeProvider:
+    """
+    Deterministic local stand-in for load testing the orchestration layer
+    without spending API quota. Returns schema-valid JSON for each task
+    (itinerary, route, budget, chat); the same prompt always gets the same text.
+
+    Latency follows a log-normal distribution around FAKE_LLM_LATENCY_MS
+    (FAKE_LLM_LATENCY_SIGMA=0 makes it fixed). FAKE_LLM_FAILURE_RATE is the
+    share of calls that raise, FAKE_LLM_TRUNCATION_RATE the share that return
+    a response cut off mid-JSON.
+    """
+
+    name = 'fake'
+
+    def __init__(self):
+        self.latency_ms = float(os.getenv('FAKE_LLM_LATENCY_MS', 800))
+        self.latency_sigma = float(os.getenv('FAKE_LLM_LATENCY_SIGMA', 0.5))
+        self.failure_rate = float(os.getenv('FAKE_LLM_FAILURE_RATE', 0))
+        self.truncation_rate = float(os.getenv('FAKE_LLM_TRUNCATION_RATE', 0))
+        self.chunk_size = int(os.getenv('FAKE_LLM_CHUNK_CHARS', 200))
+
+        # Latency and failures are random but reproducible across runs
+        self._random = random.Random(os.getenv('FAKE_LLM_SEED', 'fake-llm'))
+        self._lock = threading.Lock()
+
+    def _draw(self) -> tuple:
+        """Latency in seconds, and whether this call fails or truncates."""
+        with self._lock:
+            if self.latency_sigma > 0:
+                latency = self._random.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000
+            else:
+                latency = self.latency_ms / 1000
+            fails = self._random.random() < self.failure_rate
+            truncates = self._random.random() < self.truncation_rate
+        return latency, fails, truncates
+
+    def _respond(self, prompt: str, task: str, truncates: bool) -> str:
+        rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+
+        if task == 'route':
+            text = json.dumps(fake_route(prompt))
+        elif task == 'budget':
+            text = json.dumps(fake_budget(prompt, rng))
+        elif task == 'chat':
+            text = json.dumps(fake_chat(prompt))
+        else:
+            text = json.dumps(fake_itinerary(prompt, rng), indent=2)
+
+        if truncates:
+            text = text[:len(text) * 2 // 3]
+        return f'```json\n{text}\n```' if task == 'itinerary' else text
+
+    def generate(self, prompt: str, model_name: str, temperature: float, max_output_tokens: int, task: str = None) -> tuple:
+        latency, fails, truncates = self._draw()
+        time.sleep(latency)
+        if fails:
+            raise RuntimeError('Fake LLM provider: simulated failure')
+        text = self._respond(prompt, task, truncates)
+        return text, {'prompt_tokens': estimate_tokens(prompt), 'completion_tokens': estimate_tokens(text)}
+
+    def stream(self, prompt: str, model_name: str, temperature: float, max_output_tokens: int,
+               on_chunk, stopped, task: str = None):
+        latency, fails, truncates = self._draw()
+        text = self._respond(prompt, task, truncates)
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+        # Spread the latency over the chunks like a real token stream
+        for index, chunk in enumerate(chunks):
+            time.sleep(latency / len(chunks))
+            if stopped():
+                return None
+            if fails and index >= len(chunks) // 2:
+                raise RuntimeError('Fake LLM provider: simulated failure mid-stream')
+            on_chunk(chunk)
+        return {'prompt_tokens': estimate_tokens(prompt), 'completion_tokens': estimate_tokens(text)}
+
+
+def _prompt_cities(prompt: str) -> list:
+    """Best-effort list of the cities a prompt asks about."""
+    route = re.findall(r'^- day\d+: (.+)$', prompt, flags=re.MULTILINE)
+    if route:
+        return route
+
+    match = re.search(r'(?:visiting these locations in .+?:\n|wants to visit: )(.+)', prompt)
+    if match:
+        return [city.strip() for city in match.group(1).split(',') if city.strip()]
+
+    match = re.search(r'itinerary for (.+?)(?:, [^,.]+)?\.\n', prompt)
+    if match:
+        return [match.group(1).strip()]
+
+    return ['City Centre']
+
+
+def _day_range(prompt: str) -> range:
+    match = re.search(r'Create days (\d+) to (\d+)', prompt)
+    if match:
+        return range(int(match.group(1)), int(match.group(2)) + 1)
+
+    match = re.search(r'(\d+)-day', prompt)
+    days = int(match.group(1)) if match else 3
+    return range(1, days + 1)
+
+
+def fake_route(prompt: str) -> dict:
+    days = _day_range(prompt)
+    cities = _prompt_cities(prompt)
+    per_city = max(1, -(-len(days) // len(cities)))
+    return {f'day{n}': cities[min((n - 1) // per_city, len(cities) - 1)] for n in days}
+
+
+def fake_itinerary(prompt: str, rng: random.Random) -> dict:
+    days = _day_range(prompt)
+    cities = _prompt_cities(prompt)
+    route = re.findall(r'^- day(\d+): (.+)$', prompt, flags=re.MULTILINE)
+    route = {int(n): city for n, city in route}
+    per_city = max(1, -(-len(days) // len(cities)))
+
+    itinerary = {}
+    previous_city = None
+    for n in days:
+        city = route.get(n) or cities[min((n - days.start) // per_city, len(cities) - 1)]
+        day = {
+            'location': city,
+            'morning': [activity.format(city=city) for activity in rng.sample(FAKE_MORNING, 2)],
+            'afternoon': [activity.format(city=city) for activity in rng.sample(FAKE_AFTERNOON, 2)],
+            'evening': [activity.format(city=city) for activity in rng.sample(FAKE_EVENING, 2)],
+            'food_recommendation': f'Try the signature noodle soup at a family-run restaurant in {city}',
+            'cultural_highlight': f'{city} hosts a lantern festival every autumn'
+        }
+        if previous_city and city != previous_city:
+            day['transportation'] = {
+                'method': 'Train',
+                'duration': '2 hours',
+                'cost_local': '$40-60',
+                'cost_origin': '$40-60 USD',
+                'travel_note': f'Direct train from {previous_city} to {city}'
+            }
+        itinerary[f'day{n}'] = day
+        previous_city = city
+
+    return itinerary
+
+
+def fake_budget(prompt: str, rng: random.Random) -> dict:
+    match = re.search(r'Budget for (.+?), (\d+) days from (.+?)\.', prompt)
+    city, days = (match.group(1), int(match.group(2))) if match else ('Destination', 3)
+    hotel = rng.randint(80, 200)
+    food = rng.randint(30, 80)
+
+    def span(low):
+        return {'min': low, 'max': int(low * 1.6), 'note': 'Estimated'}
+
+    return {
+        'city': city,
+        'days': days,
+        'destination_currency_code': 'USD',
+        'destination_symbol': '$',
+        'origin_currency_code': 'USD',
+        'origin_symbol': '$',
+        'exchange_rate': 1.0,
+        'hotel_per_night': span(hotel),
+        'food_per_day': span(food),
+        'transport_total': span(25 * days),
+        'activities_total': span(30 * days),
+        'total_budget': span((hotel + food + 55) * days),
+        'currency': '$',
+        'disclaimer': 'Generated by the fake LLM provider'
+    }
+
+
+def fake_chat(prompt: str) -> dict:
+    match = re.search(r'USER REQUEST: (.+)', prompt)
+    request = match.group(1).strip() if match else 'your request'
+    return {
+        'response': f'Happy to help with "{request[:80]}". Here are a few ideas.',
+        'changes': {
+            'type': 'general',
+            'description': 'Suggestions only',
+            'update_itinerary': False,
+            'update_budget': False,
+            'suggestions': ['Start early to avoid crowds', 'Book popular attractions in advance']
+        }
+    }
+
+
+PROVIDERS = {
+    'gemini': GeminiProvider,
+    'fake': FakeProvider
+}
+
+
+def get_provider(name: str = None):
+    """
+    Instantiate the provider named by LLM_PROVIDER (default 'gemini').
+    """
+    name = (name or os.getenv('LLM_PROVIDER', 'gemini')).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f'Unknown LLM_PROVIDER "{name}". Expected one of: {", ".join(PROVIDERS)}')
+    return PROVIDERS[name]()
@@ -1,79 +1,125 @@
-import aiohttp
 import asyncio
 import re
-from agents.wiki_agent import get_wikipedia_link
-
-
-async def map_agent(country: str, itinerary: dict, locations: str = None) -> list:
+from agents.http_client import timeout
+from agents.gazetteer import Gazetteer, landmark_span
+from agents.name_cache import memoize_name, place_names
+from agents.singleflight import SingleFlight
+
+# Concurrent plans for the same destination geocode the same attractions
+nominatim_flight = SingleFlight('nominatim')
+
+# Phrases that start an activity description rather than a place name
+ACTION_PHRASES = Gazetteer([
+    'Visit', 'Explore', 'Tour', 'See', 'Discover', 'Walk through', 'Stroll through', 'Stroll and shop along',
+    'Wander through', 'Browse', 'Admire', 'Experience', 'Ascend', 'Descend', 'Relax and stroll through',
+    'Take a photo with', 'Take a photo of', 'Take a photo at', 'Take photos of', 'Enjoy', 'Immerse yourself in',
+    'Find tranquility at', 'Witness', 'Dive into the world of'
+], after=r'\s+(?:the\s+)?', ignore_case=True)
+
+ADJECTIVES = Gazetteer([
+    'beautiful', 'peaceful', 'iconic', 'world-famous', 'trendy', 'lively', 'unique', 'vibrant', 'majestic',
+    'historic', 'upscale', 'traditional', 'contemporary', 'quirky', 'famous', 'serene', 'life-sized', 'multi-story'
+], after=r'\s+(?:and\s+\w+\s+)?', ignore_case=True)
+
+# Names ending in one of these are taken as landmarks ("Meiji Shrine")
+LANDMARKS = Gazetteer([
+    'Temple', 'Shrine', 'Museum', 'Tower', 'Palace', 'Castle', 'Park', 'Garden', 'Gardens', 'Square',
+    'Market', 'Building', 'Hills', 'Observatory', 'Crossing', 'Street', 'Gate', 'Hall', 'Center', 'Centre',
+    'District', 'Skytree', 'Bridge', 'River', 'Station', 'Memorial', 'Statue'
+])
+
+# Capitalized phrases starting with one of these describe an activity, not a place
+ACTION_VERBS = frozenset([
+    'Take', 'Visit', 'Explore', 'Enjoy', 'Experience', 'Discover', 'Wander', 'Stroll', 'Ascend', 'Relax',
+    'Browse', 'Witness', 'Find', 'Dive', 'Immerse'
+])
+
+# Too broad to be worth a map pin
+GENERIC_PLACES = frozenset(['Japan', 'Tokyo', 'Emperor', 'Empress'])
+
+# "of/in/at/to [Place]" with a place of up to three capitalized words
+CONTEXT_PLACE = re.compile(r'(?:of|in|at|from|to)\s+([A-Z][\w-]+(?:\s+[A-Z][\w-]+)?(?:\s+[A-Z][\w-]+)?)')
+REGION_SUFFIX = re.compile(r'\s+(?:area|region)$', re.IGNORECASE)
+# A capital letter and everything after it that a place name can contain
+NAME_SPAN = re.compile(r'[A-Z][\w\s-]*')
+LANDMARK_DESCRIPTION = re.compile(r'\s+(?:dedicated to|featuring|known for|offering|including|home to|one of).+$', re.IGNORECASE)
+# 2-6 capitalized words
+PROPER_NOUN_PHRASE = re.compile(r'[A-Z][\w-]+(?:\s+[A-Z][\w-]+){1,5}')
+TRAILING_WORDS = re.compile(r'\s+(?:area|from|come|at|for|in|near|and).*$', re.IGNORECASE)
+
+# Leftovers stripped from extracted names before geocoding
+ATTRACTION_VERBS = Gazetteer(
+    ['Visit', 'Explore', 'See', 'Browse', 'Stroll through', 'Witness', 'Ascend', 'Experience', 'Enjoy'],
+    after=r'\s+(?:the\s+)?', ignore_case=True
+)
+ATTRACTION_ADJECTIVES = Gazetteer(['iconic', 'serene', 'tranquil'], after=r'\s+', ignore_case=True)
+
+
+async def nominatim_search(session, search_query: str) -> tuple:
     """
-    Generate map data by geocoding attractions from the itinerary.
-    Optimized for speed with concurrent requests.
+    Look up coordinates for a search query with Nominatim.
+    Returns (lat, lon), or None if nothing matched.
+    Concurrent searches for the same query share one request.
     """
-    # Extract attraction names from itinerary recommendations
-    attraction_names = extract_attractions(itinerary)
+    async def search():
+        geocode_url = f'https://nominatim.openstreetmap.org/search?q={search_query}&format=json&limit=1'
 
-    if not attraction_names:
-        print('No attractions found in itinerary')
-        return []
+        headers = {'User-Agent': 'AI-Travel-Planner/1.0'}
 
-    print(f'Geocoding {len(attraction_names)} attractions from itinerary...')
+        # Small delay before request to respect rate limits
+        await asyncio.sleep(0.15)
 
-    # Build geocoding context
-    if locations and locations.strip():
-        geocode_context = f"{locations.split(',')[0].strip()}, {country}"
-    else:
-        geocode_context = country
-
-    async def geocode_single(session, name):
-        """Geocode a single attraction with rate limiting."""
-        try:
-            # Search for the attraction with country context
-            search_query = f'{name}, {geocode_context}'
-            geocode_url = f'https://nominatim.openstreetmap.org/search?q={search_query}&format=json&limit=1'
-
-            headers = {'User-Agent': 'AI-Travel-Planner/1.0'}
-
-            # Small delay before request to respect rate limits
-            await asyncio.sleep(0.15)
-
-            async with session.get(geocode_url, headers=headers) as response:
-                data = await response.json()
-
-                if data and len(data) > 0:
-                    lat = float(data[0]['lat'])
-                    lon = float(data[0]['lon'])
-
-                    # Generate Wikipedia link for this attraction
-                    wiki_link = get_wikipedia_link(name)
-
-                    print(f'✓ Geocoded: {name}')
-                    return {
-                        'name': name,
-                        'type': 'attraction',
-                        'location': {
-                            'lat': lat,
-                            'lng': lon
-                        },
-                        'wiki': wiki_link
-                    }
-                else:
-                    print(f'✗ Could not geocode: {name}')
-                    return None
-
-        except Exception as e:
-            print(f'Error geocoding {name}: {str(e)}')
+        async with session.get(geocode_url, headers=headers, timeout=timeout(10)) as response:
+            data = await response.json()
+
+            if data and len(data) > 0:
+                return (float(data[0]['lat']), float(data[0]['lon']))
             return None
 
-    # Run all geocoding requests concurrently with timeout
-    timeout = aiohttp.ClientTimeout(total=10)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        tasks = [geocode_single(session, name) for name in attraction_names]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+    return await nominatim_flight.do(search_query, search)
+
+
+def geocode_context(country: str, locations: str = None) -> str:
+    """Region appended to every attraction search: the first location and the country."""
+    if locations and locations.strip():
+        return f"{locations.split(',')[0].strip()}, {country}"
+    return country
 
-        # Filter out None results and exceptions
-        attractions = [r for r in results if r is not None and not isinstance(r, Exception)]
 
-    print(f'Successfully geocoded {len(attractions)} attractions')
+async def geocode_attraction(session, name: str, context: str) -> tuple:
+    """Coordinates of one attraction as (lat, lon), or None if it could not be geocoded."""
+    try:
+        # Search for the attraction with country context
+        coordinates = await nominatim_search(session, f'{name}, {context}')
+    except Exception as e:
+        print(f'Error geocoding {name}: {str(e)}')
+        return None
+
+    if coordinates:
+        print(f'✓ Geocoded: {name}')
+    else:
+        print(f'✗ Could not geocode: {name}')
+    return coordinates
+
+
+def map_entries(names: list, coordinates: list, links: dict) -> list:
+    """
+    Map data for the attractions that were geocoded, with their Wikipedia links.
+    """
+    attractions = []
+    for name, location in zip(names, coordinates):
+        if location is None:
+            continue
+        lat, lon = location
+        attractions.append({
+            'name': name,
+            'type': 'attraction',
+            'location': {
+                'lat': lat,
+                'lng': lon
+            },
+            'wiki': links.get(name)
+        })
     return attractions
 
 
@@ -109,7 +155,7 @@ def extract_attractions(itinerary: dict) -> list:
             # Handle activity as dict (with wiki links) or string
             activity_text = activity['text'] if isinstance(activity, dict) and 'text' in activity else activity
             if isinstance(activity_text, str):
-                extracted = extract_place_name(activity_text)
+                extracted = cached_place_name(activity_text)
                 if extracted:
                     attractions.add(extracted)
 
@@ -118,10 +164,7 @@ def extract_attractions(itinerary: dict) -> list:
     # Clean up any remaining action verbs from attraction names before geocoding
     cleaned_attractions = []
     for attraction in attractions:
-        # Remove action verbs at the start
-        cleaned = re.sub(r'^(?:Visit|Explore|See|Browse|Stroll through|Witness|Ascend|Experience|Enjoy)\s+(?:the\s+)?', '', attraction, flags=re.IGNORECASE)
-        cleaned = re.sub(r'^(?:iconic|serene|tranquil)\s+', '', cleaned, flags=re.IGNORECASE)
-        cleaned_attractions.append(cleaned)
+        cleaned_attractions.append(clean_attraction_name(attraction))
 
     # Limit to top 8 attractions for faster geocoding (prevents delays)
     # Prioritize: keep unique landmarks, remove generic activities
@@ -132,57 +175,55 @@ def extract_attractions(itinerary: dict) -> list:
     return cleaned_attractions
 
 
+def clean_attraction_name(name: str) -> str:
+    """
+    Remove an action verb (and then an adjective) left at the start of a name.
+    """
+    return ATTRACTION_ADJECTIVES.strip_prefix(ATTRACTION_VERBS.strip_prefix(name))
+
+
 def extract_place_name(activity: str) -> str:
     """
     Extract actual place name from activity description.
     Focuses on finding proper nouns that are landmarks.
     """
     # Pattern 0: Look for "of/in [Place]" patterns first
-    context_pattern = r'(?:of|in|at|from|to)\s+([A-Z][\w-]+(?:\s+[A-Z][\w-]+)?(?:\s+[A-Z][\w-]+)?)'
-    context_match = re.search(context_pattern, activity)
+    context_match = CONTEXT_PLACE.search(activity)
     if context_match:
-        place = context_match.group(1).strip()
         # Remove common non-place endings
-        place = re.sub(r'\s+(?:area|region)$', '', place, flags=re.IGNORECASE)
+        place = REGION_SUFFIX.sub('', context_match.group(1))
         # Check if it looks like a place name
-        if len(place) > 3 and len(place) < 30 and place not in ['Japan', 'Tokyo', 'Emperor', 'Empress']:
+        if len(place) > 3 and len(place) < 30 and place not in GENERIC_PLACES:
             # Only return if it's at least 2 capitalized words or a single short word
             words = place.split()
-            if len(words) >= 1 and (len(words) > 1 or len(place) < 15):
+            if len(words) > 1 or len(place) < 15:
                 return place
 
-    # Remove common action phrases at the start
-    cleaned = re.sub(r'^(?:Visit|Explore|Tour|See|Discover|Walk through|Stroll through|Stroll and shop along|Wander through|Browse|Admire|Experience|Ascend|Descend|Relax and stroll through|Take a photo (?:with|of|at)|Take photos of|Enjoy|Immerse yourself in|Find tranquility at|Witness|Dive into the world of)\s+(?:the\s+)?', '', activity, flags=re.IGNORECASE)
-
-    # Remove adjectives at the start
-    cleaned = re.sub(r'^(?:beautiful|peaceful|iconic|world-famous|trendy|lively|unique|vibrant|majestic|historic|upscale|traditional|contemporary|quirky|famous|serene|life-sized|multi-story)\s+(?:and\s+\w+\s+)?', '', cleaned, flags=re.IGNORECASE)
+    # Remove common action phrases, then adjectives, at the start
+    cleaned = ADJECTIVES.strip_prefix(ACTION_PHRASES.strip_prefix(activity))
 
     # Pattern 1: Match landmark names with specific suffixes
-    landmark_pattern = r'^([A-Z][\w\s-]+?(?:Temple|Shrine|Museum|Tower|Palace|Castle|Park|Garden|Gardens|Square|Market|Building|Hills|Observatory|Crossing|Street|Gate|Hall|Center|Centre|District|Skytree|Bridge|River|Station|Memorial|Statue))'
-    match = re.search(landmark_pattern, cleaned)
-    if match:
-        place = match.group(1).strip()
+    place = landmark_span(cleaned, NAME_SPAN, LANDMARKS, anchored=True)
+    if place:
         # Clean up
-        place = re.sub(r',.*$', '', place)  # Remove everything after comma
-        place = re.sub(r'\s+(?:dedicated to|featuring|known for|offering|including|home to|one of).+$', '', place, flags=re.IGNORECASE)
+        place = LANDMARK_DESCRIPTION.sub('', place)
         if 4 < len(place) < 60:
             return place
 
     # Pattern 2: Match proper noun phrases (2-6 capitalized words)
-    proper_noun_pattern = r'^([A-Z][\w-]+(?:\s+[A-Z][\w-]+){1,5})'
-    match = re.search(proper_noun_pattern, cleaned)
+    match = PROPER_NOUN_PHRASE.match(cleaned)
     if match:
-        place = match.group(1).strip()
         # Remove common trailing words that aren't part of place names
-        place = re.sub(r'\s+(?:area|from|come|at|for|in|near|and).*$', '', place, flags=re.IGNORECASE)
-        place = re.sub(r',.*$', '', place)
+        place = TRAILING_WORDS.sub('', match.group())
 
         # Filter out verb phrases and non-places
-        action_verbs = ['Take', 'Visit', 'Explore', 'Enjoy', 'Experience', 'Discover', 'Wander', 'Stroll', 'Ascend', 'Relax', 'Browse', 'Witness', 'Find', 'Dive', 'Immerse']
-        if place.split()[0] not in action_verbs and 5 < len(place) < 60:
-            words = place.split()
-            # Require at least 2 words for a proper place name
-            if len(words) >= 2:
-                return place
+        words = place.split()
+        # Require at least 2 words for a proper place name
+        if words[0] not in ACTION_VERBS and 5 < len(place) < 60 and len(words) >= 2:
+            return place
 
     return None
+
+
+# extract_attractions sees the same activity strings across plans
+cached_place_name = memoize_name(place_names, extract_place_name)
@@ -0,0 +1,142 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from agents.cache_store import caches
+from agents.nlp_worker import nlp_pool
+from agents.singleflight import flights
+
+# Prometheus metrics for the /metrics endpoint. Under uvicorn with several
+# workers, set PROMETHEUS_MULTIPROC_DIR to an empty directory so counters and
+# histograms are aggregated across processes (cache and single-flight
+# statistics are always those of the worker that answers the scrape).
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR', '')
+
+AGENT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+UPSTREAM_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+agent_duration = Histogram(
+    'agent_duration_seconds', 'Wall time of each agent call',
+    ['agent', 'outcome'], buckets=AGENT_BUCKETS
+)
+upstream_requests = Counter(
+    'upstream_requests_total', 'External API requests by host and status code (or error type)',
+    ['host', 'status']
+)
+upstream_duration = Histogram(
+    'upstream_request_duration_seconds', 'External API request latency by host',
+    ['host'], buckets=UPSTREAM_BUCKETS
+)
+llm_requests = Counter(
+    'llm_requests_total', 'LLM provider calls by task and outcome',
+    ['provider', 'task', 'outcome']
+)
+llm_duration = Histogram(
+    'llm_request_duration_seconds', 'LLM provider call latency by task',
+    ['provider', 'task'], buckets=AGENT_BUCKETS
+)
+llm_tokens = Counter(
+    'llm_tokens_total', 'LLM tokens used; source is "estimated" when the provider reports no usage',
+    ['provider', 'model', 'type', 'source']
+)
+json_parse_failures = Counter(
+    'llm_json_parse_failures_total', 'LLM responses that could not be parsed as the expected JSON',
+    ['parser', 'reason']
+)
+
+
+@contextmanager
+def time_agent(agent: str):
+    """Observe the duration of an agent call, labelled by whether it raised."""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        record_agent(agent, outcome, time.perf_counter() - started)
+
+
+def record_agent(agent: str, outcome: str, seconds: float):
+    agent_duration.labels(agent, outcome).observe(seconds)
+
+
+def record_upstream(host: str, status, seconds: float):
+    upstream_requests.labels(host or 'unknown', str(status)).inc()
+    upstream_duration.labels(host or 'unknown').observe(seconds)
+
+
+def record_llm_call(provider: str, task: str, outcome: str, seconds: float):
+    llm_requests.labels(provider, task or 'generate', outcome).inc()
+    llm_duration.labels(provider, task or 'generate').observe(seconds)
+
+
+def record_tokens(provider: str, model: str, prompt_tokens: int, completion_tokens: int, source: str = 'reported'):
+    llm_tokens.labels(provider, model, 'prompt', source).inc(prompt_tokens)
+    llm_tokens.labels(provider, model, 'completion', source).inc(completion_tokens)
+
+
+def record_parse_failure(parser: str, reason: str):
+    json_parse_failures.labels(parser, reason).inc()
+
+
+def http_metrics_config():
+    """aiohttp TraceConfig counting every request by host and status."""
+    import aiohttp
+
+    async def on_request_start(session, context, params):
+        context.metrics_started = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        record_upstream(params.url.host, params.response.status, time.perf_counter() - context.metrics_started)
+
+    async def on_request_exception(session, context, params):
+        record_upstream(params.url.host, type(params.exception).__name__, time.perf_counter() - context.metrics_started)
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    return config
+
+
+class StatsCollector:
+    """Exposes the counters kept by every TieredCache and SingleFlight, and the NLP pool backlog, at scrape time."""
+
+    def collect(self):
+        lookups = CounterMetricFamily('cache_requests', 'Cache lookups by result', labels=['cache', 'result'])
+        ratio = GaugeMetricFamily('cache_hit_ratio', 'Share of cache lookups that were hits', labels=['cache'])
+        entries = GaugeMetricFamily('cache_entries', 'Entries held in the in-memory tier', labels=['cache'])
+        for name, cache in sorted(caches.items()):
+            stats = cache.stats()
+            for result in ('memory_hits', 'disk_hits', 'misses'):
+                lookups.add_metric([name, result], stats[result])
+            ratio.add_metric([name], stats['hit_ratio'])
+            entries.add_metric([name], stats['size'])
+
+        calls = CounterMetricFamily('singleflight_calls', 'Calls that started work or joined one in flight',
+                                    labels=['flight', 'result'])
+        for name, flight in sorted(flights.items()):
+            for result, count in flight.stats().items():
+                calls.add_metric([name, result], count)
+
+        nlp_jobs = GaugeMetricFamily('nlp_jobs_pending', 'Extraction jobs queued or running on the NLP worker pool')
+        nlp_jobs.add_metric([], nlp_pool.pending())
+
+        yield from (lookups, ratio, entries, calls, nlp_jobs)
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def render() -> tuple:
+    """Current metrics in the Prometheus text format, with their content type."""
+    registry = REGISTRY
+    if MULTIPROC_DIR:
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(stats_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
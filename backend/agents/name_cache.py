@@ -0,0 +1,98 @@
+import os
+import functools
+from agents import extraction
+from agents.cache_store import TieredCache
+from agents.nlp_worker import nlp_pool
+
+# Activity text -> extracted name caches. LLM itineraries repeat the same
+# activities across plans ("Visit Senso-ji Temple"), so after the first time a
+# string's attraction and place names are a lookup instead of spaCy or regex work.
+# Only the server process uses these; NLP worker processes never open them.
+EXTRACTION_CACHE_ENABLED = os.getenv('EXTRACTION_CACHE_ENABLED', '1') == '1'
+EXTRACTION_CACHE_SIZE = int(os.getenv('EXTRACTION_CACHE_SIZE', 8192))  # Activities kept in memory, per cache
+EXTRACTION_CACHE_TTL = float(os.getenv('EXTRACTION_CACHE_TTL', 7 * 24 * 3600))  # Seconds
+EXTRACTION_CACHE_PATH = os.getenv('EXTRACTION_CACHE_PATH', '')  # SQLite file shared by workers; empty for memory only
+
+# Part of every key, so names cached by older extractors (including ones kept
+# in EXTRACTION_CACHE_PATH) are never served. Bump it whenever extraction.py or
+# the place-name extraction in map_agent.py changes what it returns.
+EXTRACTOR_VERSION = 1
+
+# Stored for activities with no name, since the caches treat None as a miss
+NO_NAME = ''
+
+attraction_names = TieredCache(
+    'attraction_names', maxsize=EXTRACTION_CACHE_SIZE, ttl=EXTRACTION_CACHE_TTL, path=EXTRACTION_CACHE_PATH or None
+)
+place_names = TieredCache(
+    'place_names', maxsize=EXTRACTION_CACHE_SIZE, ttl=EXTRACTION_CACHE_TTL, path=EXTRACTION_CACHE_PATH or None
+)
+
+
+def activity_key(activity: str) -> str:
+    """
+    The activity with runs of whitespace collapsed to one space. Case is kept,
+    since the extractors rely on capitalization. Names are extracted from the
+    key itself, so a cached name is always the one the extractor would return.
+    """
+    return ' '.join(activity.split())
+
+
+def memoize_name(cache: TieredCache, extract):
+    """
+    extract(activity) for a synchronous extractor, answered from cache when the
+    same activity has been seen before. Activities with no name are cached too.
+    """
+    @functools.wraps(extract)
+    def memoized(activity: str) -> str:
+        if not EXTRACTION_CACHE_ENABLED:
+            return extract(activity)
+
+        key = activity_key(activity)
+        cache_key = f'{EXTRACTOR_VERSION}:{key}'
+        name = cache.get(cache_key)
+        if name is None:
+            name = extract(key) or NO_NAME
+            cache.set(cache_key, name)
+        return name or None
+
+    return memoized
+
+
+async def extract_attraction_names(activities: list) -> list:
+    """
+    nlp_pool.extract with a cache in front: attraction names for the
+    activities, in order (None where nothing was found). Only the distinct
+    activities not seen before go to the NLP pool.
+
+    Keys include whether spaCy (and which model version) or the regex
+    extractor produced the name, and regex stand-ins for a busy or failed pool
+    are never cached, so they can't shadow spaCy's names once the pool recovers.
+    """
+    if not EXTRACTION_CACHE_ENABLED:
+        return await nlp_pool.extract(activities)
+
+    if extraction.spacy_available():
+        extractor = f'{EXTRACTOR_VERSION}:spacy-{extraction.spacy_model_version()}'
+    else:
+        extractor = f'{EXTRACTOR_VERSION}:regex'
+    keys = [activity_key(activity) for activity in activities]
+
+    names = {}
+    misses = []
+    for key in dict.fromkeys(keys):
+        name = attraction_names.get(f'{extractor}:{key}')
+        if name is None:
+            misses.append(key)
+        else:
+            names[key] = name or None
+
+    if misses:
+        extracted = await nlp_pool.extract(misses, fallback=False)
+        if extracted is None:
+            extracted = [extraction.extract_attraction_name_regex(key) for key in misses]
+        else:
+            attraction_names.set_many([(f'{extractor}:{key}', name or NO_NAME) for key, name in zip(misses, extracted)])
+        names.update(zip(misses, extracted))
+
+    return [names[key] for key in keys]
@@ -1,5 +1,6 @@
 import os
-import aiohttp
+import asyncio
+from agents.http_client import get_session, timeout
 
 
 # Country name to ISO 3166-1 alpha-2 code mapping for NewsData.io API
@@ -108,38 +109,37 @@ async def news_agent(country: str, locations: str = None) -> list:
             print(f'📰 Fetching news for {country} (no country code, using search)')
 
         # Set timeout to 5 seconds (increased slightly for reliability)
-        timeout = aiohttp.ClientTimeout(total=5)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-
-                    if data.get('status') == 'success' and data.get('results'):
-                        articles = []
-                        for article in data['results'][:5]:  # Return top 5
-                            # Ensure the article is relevant to the destination
-                            title = article.get('title', 'No title')
-                            description = article.get('description', 'No description available')
-
-                            articles.append({
-                                'title': title,
-                                'description': description,
-                                'url': article.get('link', ''),
-                                'source': article.get('source_id', 'Unknown'),
-                                'publishedAt': article.get('pubDate', ''),
-                                'imageUrl': article.get('image_url', '')
-                            })
-
-                        print(f'✓ Fetched {len(articles)} local news articles for {country}')
-                        return articles
-                    else:
-                        print(f'⚠ No news articles found for {country}')
-                        return []
+        session = get_session()
+        async with session.get(url, params=params, timeout=timeout(5)) as response:
+            if response.status == 200:
+                data = await response.json()
+
+                if data.get('status') == 'success' and data.get('results'):
+                    articles = []
+                    for article in data['results'][:5]:  # Return top 5
+                        # Ensure the article is relevant to the destination
+                        title = article.get('title', 'No title')
+                        description = article.get('description', 'No description available')
+
+                        articles.append({
+                            'title': title,
+                            'description': description,
+                            'url': article.get('link', ''),
+                            'source': article.get('source_id', 'Unknown'),
+                            'publishedAt': article.get('pubDate', ''),
+                            'imageUrl': article.get('image_url', '')
+                        })
+
+                    print(f'✓ Fetched {len(articles)} local news articles for {country}')
+                    return articles
                 else:
-                    print(f'✗ News API error: Status {response.status}')
+                    print(f'⚠ No news articles found for {country}')
                     return []
+            else:
+                print(f'✗ News API error: Status {response.status}')
+                return []
 
-    except aiohttp.ClientTimeout:
+    except asyncio.TimeoutError:
         print(f'✗ News API timeout after 5 seconds')
         return []
     except Exception as e:
@@ -0,0 +1,131 @@
+import os
+import atexit
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from agents import extraction
+
+# spaCy inference is CPU bound and holds the GIL, so attraction names are
+# extracted in a pool of worker processes that each load the model once.
+# The event loop awaits the result instead of running inference itself.
+NLP_POOL_SIZE = int(os.getenv('NLP_POOL_SIZE', 2))  # Worker processes; 0 runs extraction on a thread here
+NLP_QUEUE_DEPTH = int(os.getenv('NLP_QUEUE_DEPTH', 32))  # Jobs queued or running before new ones fall back to regex
+NLP_TIMEOUT = float(os.getenv('NLP_TIMEOUT', 15))  # Seconds, including the model load on a worker's first job
+
+
+def _init_worker():
+    extraction.get_nlp()
+
+
+def _extract(activities: list) -> list:
+    return extraction.extract_attraction_names(activities)
+
+
+class NLPPool:
+    """
+    Runs batched extraction jobs on worker processes. At most queue_depth jobs
+    are outstanding at once; beyond that (or if the pool fails or times out)
+    a job is answered with the regex extractor instead of waiting. A job that
+    timed out keeps its place in the queue until a worker has finished it.
+    """
+
+    def __init__(self, size: int, queue_depth: int, timeout: float):
+        self.size = size
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self._executor = None
+        self._executor_pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            # A forked server worker must not reuse its parent's pool
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    # spawn keeps the server's threads and event loop out of the workers
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _reserve(self) -> bool:
+        with self._lock:
+            if self._pending >= self.queue_depth:
+                return False
+            self._pending += 1
+            return True
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def pending(self) -> int:
+        return self._pending
+
+    async def extract(self, activities: list, fallback: bool = True) -> list:
+        """
+        Attraction names for the activities, in order (None where nothing was found).
+        If the pool can't take or finish the job the regex extractor answers
+        instead, or with fallback=False the whole result is None.
+        """
+        if not activities:
+            return []
+
+        # Without the model there is only the cheap regex extractor to run
+        if not extraction.spacy_available():
+            return extraction.extract_attraction_names(activities)
+
+        if self.size <= 0:
+            return await asyncio.to_thread(extraction.extract_attraction_names, activities)
+
+        if not self._reserve():
+            print(f'⚠️  NLP queue full ({self.queue_depth} jobs), using regex extraction')
+            return self._regex_names(activities) if fallback else None
+
+        executor = self._get_executor()
+        try:
+            job = executor.submit(_extract, activities)
+        except BrokenProcessPool:
+            self._release()
+            self._restart(executor)
+            return self._regex_names(activities) if fallback else None
+        # The slot is freed when a worker is done with the job (or it is
+        # cancelled before one picks it up), not when we stop waiting for it
+        job.add_done_callback(lambda done: self._release())
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(job), self.timeout)
+        except asyncio.TimeoutError:
+            print(f'⚠️  NLP extraction timed out after {self.timeout}s, using regex extraction')
+        except BrokenProcessPool:
+            self._restart(executor)
+
+        return self._regex_names(activities) if fallback else None
+
+    @staticmethod
+    def _regex_names(activities: list) -> list:
+        return [extraction.extract_attraction_name_regex(activity) for activity in activities]
+
+    def _restart(self, executor: ProcessPoolExecutor):
+        """Shut a broken pool down; the next job starts a new one."""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            print('✗ NLP worker process died, restarting the pool')
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+nlp_pool = NLPPool(NLP_POOL_SIZE, NLP_QUEUE_DEPTH, NLP_TIMEOUT)
+atexit.register(nlp_pool.shutdown)
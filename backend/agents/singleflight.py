@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import weakref
+
+
+# Every SingleFlight by name, so their statistics can be reported in one place
+flights = {}
+
+
+class _Call:
+    """An in-flight computation and how many callers are awaiting it."""
+
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one in-flight computation.
+    The first caller starts the work; callers arriving while it is still running
+    await the same result instead of repeating it. Nothing is kept afterwards.
+    The work is cancelled once every caller awaiting it has been cancelled.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # Tasks are bound to their loop, so track in-flight calls per loop
+        self._calls = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._counts = {'started': 0, 'coalesced': 0}
+        flights[name] = self
+
+    async def do(self, key, func):
+        """
+        Return the result of func() for this key, sharing a call already in progress.
+        func is a zero-argument callable returning a coroutine.
+        """
+        loop = asyncio.get_running_loop()
+        calls = self._calls.setdefault(loop, {})
+        call = calls.get(key)
+
+        if call is None:
+            call = _Call(loop.create_task(func()))
+            calls[key] = call
+            call.task.add_done_callback(lambda done: self._forget(calls, key, call))
+            self._count('started')
+        else:
+            self._count('coalesced')
+
+        # A caller giving up (e.g. a disconnected client) must not cancel the
+        # work other callers are still waiting on, but the last one to go does
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # Later callers start afresh rather than joining the cancelled work
+                self._forget(calls, key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    @staticmethod
+    def _forget(calls: dict, key, call: _Call):
+        if calls.get(key) is call:
+            del calls[key]
+
+    def _count(self, field: str):
+        with self._lock:
+            self._counts[field] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Per-request span tracing. A trace is started for each request and follows it
+# through the shared event loop via context variables; agents, LLM calls,
+# external HTTP requests and DB queries each record a span. Finished traces
+# are summarized in the Server-Timing header and, with TRACE_EXPORT_DIR set,
+# written out as OTLP/JSON files (one per request).
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', '1') == '1'
+TRACE_EXPORT_DIR = os.getenv('TRACE_EXPORT_DIR', '')  # Empty disables export
+SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'ai-travel-planner-backend')
+
+# Span kinds, which double as the Server-Timing grouping
+SERVER, AGENT, LLM, HTTP, DB = 'server', 'agent', 'llm', 'http', 'db'
+
+_trace = contextvars.ContextVar('trace', default=None)
+_span = contextvars.ContextVar('span', default=None)
+
+
+class Span:
+    def __init__(self, trace, name: str, kind: str, parent=None, attributes: dict = None):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, error: BaseException = None):
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        if error is not None:
+            self.error = f'{type(error).__name__}: {error}'
+        self.trace.add(self)
+
+    def to_otlp(self) -> dict:
+        return {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id or '',
+            'name': self.name,
+            'kind': 2 if self.kind == SERVER else 3 if self.kind in (HTTP, LLM, DB) else 1,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.start_ns + int(self.duration_ms * 1e6)),
+            'attributes': [
+                {'key': key, 'value': {'stringValue': str(value)}}
+                for key, value in {'span.kind': self.kind, **self.attributes}.items()
+            ],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 1}
+        }
+
+
+class _NoSpan:
+    """Stand-in returned by start_span outside a trace, so callers need no checks."""
+
+    def set(self, **attributes):
+        pass
+
+    def end(self, error: BaseException = None):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Trace:
+    """The finished spans of one request. Spans may end on any thread."""
+
+    def __init__(self, name: str):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.spans = []
+        self._lock = threading.Lock()
+        self.finished = False
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return list(self.spans)
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing header value: one entry per agent, then the summed time
+        and call count of LLM, HTTP and DB spans (which overlap, so the sums
+        can exceed the request's wall time).
+        """
+        entries = []
+        totals = {}
+        for span in self.snapshot():
+            if span.kind == AGENT:
+                entries.append(f'{span.name};dur={span.duration_ms:.1f}')
+            elif span.kind in (LLM, HTTP, DB):
+                count, ms = totals.get(span.kind, (0, 0.0))
+                totals[span.kind] = (count + 1, ms + span.duration_ms)
+
+        for kind in (LLM, HTTP, DB):
+            if kind in totals:
+                count, ms = totals[kind]
+                entries.append(f'{kind};desc="{count} call{"s" if count != 1 else ""}";dur={ms:.1f}')
+
+        root = next((span for span in self.snapshot() if span.kind == SERVER), None)
+        if root is not None:
+            entries.append(f'total;dur={root.duration_ms:.1f}')
+        return ', '.join(entries)
+
+    def to_otlp(self) -> dict:
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+                'scopeSpans': [{
+                    'scope': {'name': 'agents.tracing'},
+                    'spans': [span.to_otlp() for span in sorted(self.snapshot(), key=lambda s: s.start_ns)]
+                }]
+            }]
+        }
+
+    def export(self, directory: str = None):
+        directory = directory or TRACE_EXPORT_DIR
+        if not directory:
+            return
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'{self.trace_id}.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.to_otlp(), f)
+
+
+def current_trace():
+    return _trace.get()
+
+
+def start_trace(name: str, **attributes):
+    """
+    Start a trace for the current request with a root span of kind 'server'.
+    Returns the root span (None when tracing is disabled).
+    """
+    if not TRACING_ENABLED:
+        return None
+    trace = Trace(name)
+    root = Span(trace, name, SERVER, attributes=attributes)
+    _trace.set(trace)
+    _span.set(root)
+    return root
+
+
+def finish_trace(root: Span, error: BaseException = None):
+    """End the root span and export the trace. Safe to call more than once."""
+    if root is None or root.trace.finished:
+        return
+    root.trace.finished = True
+    root.end(error)
+    try:
+        root.trace.export()
+    except OSError as e:
+        print(f'✗ Could not export trace {root.trace.trace_id}: {e}')
+
+
+@contextmanager
+def activate(root: Span):
+    """Make a trace current again, e.g. in a streaming generator running outside the request context."""
+    trace_token = _trace.set(root.trace if root else None)
+    span_token = _span.set(root)
+    try:
+        yield
+    finally:
+        _span.reset(span_token)
+        _trace.reset(trace_token)
+
+
+def start_span(name: str, kind: str, **attributes):
+    """
+    Start a leaf span in the current trace (a no-op span outside one).
+    The caller must call span.end(). Leaf spans never become the parent of
+    later spans, so they can be ended from callbacks, other tasks, or across
+    the yields of an async generator.
+    """
+    trace = _trace.get()
+    if trace is None:
+        return NO_SPAN
+    return Span(trace, name, kind, parent=_span.get(), attributes=attributes)
+
+
+@contextmanager
+def span(name: str, kind: str = AGENT, **attributes):
+    """
+    Record a span around a block. Spans started inside it are its children.
+    Yields the span (a no-op span outside a trace) so attributes can be added.
+    """
+    trace = _trace.get()
+    if trace is None:
+        yield NO_SPAN
+        return
+
+    parent = _span.get()
+    current = Span(trace, name, kind, parent=parent, attributes=attributes)
+    # Restore the parent rather than resetting a token: async generators may
+    # finish in a different context than they started in
+    _span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    finally:
+        _span.set(parent)
+        current.end()
+
+
+def http_trace_config():
+    """aiohttp TraceConfig recording a span for every request made through a session."""
+    import aiohttp
+
+    async def on_request_start(session, context, params):
+        context.span = start_span(f'{params.method} {params.url.host}', HTTP,
+                                  **{'http.method': params.method, 'http.url': str(params.url.with_query(None))})
+
+    async def on_request_end(session, context, params):
+        context.span.set(**{'http.status_code': params.response.status})
+        context.span.end()
+
+    async def on_request_exception(session, context, params):
+        context.span.end(params.exception)
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    return config
+
+
+_sqlalchemy_instrumented = False
+
+
+def instrument_sqlalchemy():
+    """Record a span for every SQL statement executed by any SQLAlchemy engine."""
+    global _sqlalchemy_instrumented
+    if _sqlalchemy_instrumented:
+        return
+    _sqlalchemy_instrumented = True
+
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'SQL'
+        conn.info.setdefault('trace_spans', []).append(
+            start_span(f'db {operation}', DB, **{'db.statement': ' '.join(statement.split())[:500]})
+        )
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get('trace_spans')
+        if spans:
+            spans.pop().end()
+
+    @event.listens_for(Engine, 'handle_error')
+    def handle_error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get('trace_spans') if conn is not None else None
+        if spans:
+            spans.pop().end(exception_context.original_exception)
@@ -1,4 +1,5 @@
-import aiohttp
+from agents.http_client import get_session, timeout
+from agents.singleflight import SingleFlight
 
 
 # Weather code to condition mapping for Open-Meteo
@@ -30,10 +31,21 @@ WEATHER_CODES = {
 }
 
 
+# Concurrent requests for the same destination share one geocoding call
+geocode_flight = SingleFlight('open-meteo-geocode')
+
+
 async def geocode_location(location: str) -> tuple:
     """
     Geocode a location to get latitude and longitude using Open-Meteo's geocoding API.
     """
+    return await geocode_flight.do(location, lambda: fetch_geocode(location))
+
+
+async def fetch_geocode(location: str) -> tuple:
+    """
+    Query Open-Meteo's geocoding API for a single location.
+    """
     try:
         url = 'https://geocoding-api.open-meteo.com/v1/search'
         params = {
@@ -43,16 +55,15 @@ async def geocode_location(location: str) -> tuple:
             'format': 'json'
         }
 
-        timeout = aiohttp.ClientTimeout(total=3)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url, params=params) as response:
-                data = await response.json()
+        session = get_session()
+        async with session.get(url, params=params, timeout=timeout(3)) as response:
+            data = await response.json()
 
-                if data.get('results') and len(data['results']) > 0:
-                    result = data['results'][0]
-                    return (result['latitude'], result['longitude'], result.get('name', location))
+            if data.get('results') and len(data['results']) > 0:
+                result = data['results'][0]
+                return (result['latitude'], result['longitude'], result.get('name', location))
 
-                return None
+            return None
 
     except Exception as error:
         print(f'Error geocoding location {location}: {error}')
@@ -95,51 +106,50 @@ async def weather_agent(country: str, locations: str = None, days: int = 3) -> d
             'temperature_unit': 'celsius'
         }
 
-        timeout = aiohttp.ClientTimeout(total=5)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url, params=params) as response:
-                data = await response.json()
-
-                if 'daily' not in data:
-                    print(f'No weather data available for {destination}')
-                    return None
-
-                daily = data['daily']
+        session = get_session()
+        async with session.get(url, params=params, timeout=timeout(5)) as response:
+            data = await response.json()
 
-                # Build weather forecast
-                weather_data = {
-                    'location': location_name,
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'timezone': data.get('timezone', 'UTC'),
-                    'forecast': []
-                }
+            if 'daily' not in data:
+                print(f'No weather data available for {destination}')
+                return None
 
-                # Process each day
-                for i in range(len(daily['time'])):
-                    weather_code = daily['weathercode'][i]
-                    condition_text, condition_icon = WEATHER_CODES.get(weather_code, ("Unknown", "❓"))
-
-                    day_forecast = {
-                        'date': daily['time'][i],
-                        'maxtemp_c': round(daily['temperature_2m_max'][i], 1),
-                        'mintemp_c': round(daily['temperature_2m_min'][i], 1),
-                        'maxtemp_f': round(daily['temperature_2m_max'][i] * 9/5 + 32, 1),
-                        'mintemp_f': round(daily['temperature_2m_min'][i] * 9/5 + 32, 1),
-                        'precipitation_sum': round(daily['precipitation_sum'][i], 1),
-                        'precipitation_probability': daily['precipitation_probability_max'][i],
-                        'wind_speed_max': round(daily['windspeed_10m_max'][i], 1),
-                        'weather_code': weather_code,
-                        'condition': {
-                            'text': condition_text,
-                            'icon': condition_icon
-                        }
+            daily = data['daily']
+
+            # Build weather forecast
+            weather_data = {
+                'location': location_name,
+                'latitude': latitude,
+                'longitude': longitude,
+                'timezone': data.get('timezone', 'UTC'),
+                'forecast': []
+            }
+
+            # Process each day
+            for i in range(len(daily['time'])):
+                weather_code = daily['weathercode'][i]
+                condition_text, condition_icon = WEATHER_CODES.get(weather_code, ("Unknown", "❓"))
+
+                day_forecast = {
+                    'date': daily['time'][i],
+                    'maxtemp_c': round(daily['temperature_2m_max'][i], 1),
+                    'mintemp_c': round(daily['temperature_2m_min'][i], 1),
+                    'maxtemp_f': round(daily['temperature_2m_max'][i] * 9/5 + 32, 1),
+                    'mintemp_f': round(daily['temperature_2m_min'][i] * 9/5 + 32, 1),
+                    'precipitation_sum': round(daily['precipitation_sum'][i], 1),
+                    'precipitation_probability': daily['precipitation_probability_max'][i],
+                    'wind_speed_max': round(daily['windspeed_10m_max'][i], 1),
+                    'weather_code': weather_code,
+                    'condition': {
+                        'text': condition_text,
+                        'icon': condition_icon
                     }
+                }
 
-                    weather_data['forecast'].append(day_forecast)
+                weather_data['forecast'].append(day_forecast)
 
-                print(f'✓ Fetched {forecast_days}-day weather forecast for {location_name}')
-                return weather_data
+            print(f'✓ Fetched {forecast_days}-day weather forecast for {location_name}')
+            return weather_data
 
     except Exception as error:
         print(f'Error fetching weather for {weather_location}: {error}')
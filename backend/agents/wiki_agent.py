@@ -1,187 +1,218 @@
+import os
 import re
-import spacy
+import json
 import urllib.parse
 import aiohttp
 import asyncio
+from agents.cache_store import INSTANCE_DIR, TieredCache
+from agents.http_client import timeout
+from agents.singleflight import SingleFlight
+from agents.wiki_index import DEFAULT_INDEX_PATH, load_index
 
-# Load spaCy model for POS tagging
-try:
-    nlp = spacy.load('en_core_web_sm')
-except OSError:
-    # Fallback if model not installed
-    nlp = None
+WIKIPEDIA_API_URL = 'https://en.wikipedia.org/w/api.php'
+WIKIPEDIA_BATCH_SIZE = 50  # Most titles the query API accepts per request
 
+# Characters MediaWiki never allows in a title ('|' would also split the batch)
+INVALID_TITLE_CHARS = re.compile(r'[|<>\[\]{}]')
 
-async def verify_wikipedia_link(url: str, session: aiohttp.ClientSession) -> bool:
+# Title -> URL cache shared by every worker process. Titles without an article
+# are cached too (as an empty string), for a shorter time in case one is written
+WIKI_CACHE_ENABLED = os.getenv('WIKI_CACHE_ENABLED', '1') == '1'
+WIKI_CACHE_SIZE = int(os.getenv('WIKI_CACHE_SIZE', 4096))  # Titles kept in memory
+WIKI_CACHE_TTL = float(os.getenv('WIKI_CACHE_TTL', 30 * 24 * 3600))  # Seconds, for found articles
+WIKI_CACHE_MISS_TTL = float(os.getenv('WIKI_CACHE_MISS_TTL', 24 * 3600))  # Seconds, for titles with no article
+WIKI_CACHE_PATH = os.getenv('WIKI_CACHE_PATH', os.path.join(INSTANCE_DIR, 'wiki_cache.db'))  # Empty for memory only
+WIKI_CACHE_WARM_FILE = os.getenv('WIKI_CACHE_WARM_FILE', '')  # JSON {title: url or null} loaded at startup
+
+NO_ARTICLE = ''
+
+# Offline title index (see wiki_index.py). When the file exists it answers every
+# lookup without the network; titles it doesn't contain are treated as missing
+WIKI_INDEX_PATH = os.getenv('WIKI_INDEX_PATH', DEFAULT_INDEX_PATH)  # Empty disables the index
+
+wiki_cache = TieredCache('wikipedia_links', maxsize=WIKI_CACHE_SIZE, path=WIKI_CACHE_PATH or None)
+
+# Concurrent plans often look up the same landmarks at the same moment
+wiki_flight = SingleFlight('wikipedia')
+
+
+def cache_links(links: dict):
+    """Store resolved titles, found and not found, each with its own TTL."""
+    found = [(title, url) for title, url in links.items() if url]
+    missing = [(title, NO_ARTICLE) for title, url in links.items() if not url]
+    if found:
+        wiki_cache.set_many(found, ttl=WIKI_CACHE_TTL)
+    if missing:
+        wiki_cache.set_many(missing, ttl=WIKI_CACHE_MISS_TTL)
+
+
+def warm_wiki_cache(path: str) -> int:
     """
-    Verify that a Wikipedia URL actually exists and is not a 404 page.
-    Returns True if the page exists, False otherwise.
+    Load {title: url or null} pairs from a JSON file into the cache, e.g. links
+    exported from another deployment. Returns how many titles were loaded.
     """
     try:
-        headers = {
-            'User-Agent': 'AI-Travel-Planner/1.0 (Educational Project)'
-        }
-        async with session.head(url, headers=headers, timeout=aiohttp.ClientTimeout(total=2), allow_redirects=True) as response:
-            return response.status == 200
-    except:
-        return False
+        with open(path, encoding='utf-8') as f:
+            links = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f'✗ Could not warm the Wikipedia cache from {path}: {e}')
+        return 0
 
+    if not isinstance(links, dict):
+        print(f'✗ Could not warm the Wikipedia cache from {path}: expected a JSON object')
+        return 0
+
+    cache_links({title: url for title, url in links.items() if title})
+    print(f'✓ Warmed the Wikipedia cache with {len(links)} titles from {path}')
+    return len(links)
 
-async def get_wikipedia_link(location: str, session: aiohttp.ClientSession) -> str:
-    """
-    Construct a Wikipedia URL from the location name and verify it exists.
-    Returns the URL only if the page actually exists, None otherwise.
-    """
-    if not location or len(location) < 3:
-        return None
 
-    # Replace spaces with underscores for Wikipedia URL format
-    formatted_topic = location.replace(' ', '_')
+if WIKI_CACHE_ENABLED and WIKI_CACHE_WARM_FILE:
+    warm_wiki_cache(WIKI_CACHE_WARM_FILE)
 
-    # URL encode special characters
-    formatted_topic = urllib.parse.quote(formatted_topic, safe='_')
 
-    # Construct Wikipedia URL
-    wiki_url = f'https://en.wikipedia.org/wiki/{formatted_topic}'
+def wikipedia_url(title: str) -> str:
+    """Article URL for a Wikipedia page title."""
+    return f"https://en.wikipedia.org/wiki/{urllib.parse.quote(title.replace(' ', '_'), safe='_')}"
 
-    # Verify the link actually works
-    if await verify_wikipedia_link(wiki_url, session):
-        return wiki_url
 
-    # Try with first letter capitalized variant
-    if location and location[0].islower():
-        capitalized = location[0].upper() + location[1:]
-        formatted_topic = urllib.parse.quote(capitalized.replace(' ', '_'), safe='_')
-        alt_url = f'https://en.wikipedia.org/wiki/{formatted_topic}'
-        if await verify_wikipedia_link(alt_url, session):
-            return alt_url
+async def resolve_titles(titles, session: aiohttp.ClientSession) -> dict:
+    """
+    Resolve candidate page titles to Wikipedia URLs in as few requests as possible.
+    With an offline title index every title is answered locally. Otherwise cached
+    titles are answered locally and the rest go to the MediaWiki query API in
+    batches of up to 50, following title normalization and redirects.
+    Returns {title: url or None} for every title, None meaning there is no
+    such article (or the lookup failed).
+    """
+    titles = list(titles)
+    links = {title: None for title in titles}
+    unique = list(dict.fromkeys(
+        title for title in titles
+        if title and len(title) >= 3 and not INVALID_TITLE_CHARS.search(title)
+    ))
+
+    index = load_index(WIKI_INDEX_PATH) if WIKI_INDEX_PATH else None
+    if index is not None:
+        for title in unique:
+            canonical = index.resolve(title)
+            links[title] = wikipedia_url(canonical) if canonical else None
+        return links
+
+    if WIKI_CACHE_ENABLED:
+        uncached = []
+        for title in unique:
+            url = wiki_cache.get(title)
+            if url is None:
+                uncached.append(title)
+            else:
+                links[title] = url or None
+        unique = uncached
 
-    return None
+    batches = [unique[i:i + WIKIPEDIA_BATCH_SIZE] for i in range(0, len(unique), WIKIPEDIA_BATCH_SIZE)]
 
+    # Concurrent lookups of the same batch share one request
+    results = await asyncio.gather(*(
+        wiki_flight.do('|'.join(batch), lambda batch=batch: query_titles(batch, session))
+        for batch in batches
+    ))
 
-def extract_attraction_name(activity: str) -> str:
+    for result in results:
+        links.update(result)
+    return links
+
+
+async def query_titles(titles: list, session: aiohttp.ClientSession) -> dict:
     """
-    Extract attraction name from activity description using spaCy NER to capture full entity names.
+    Look up one batch of titles with action=query. Returns {title: url or None},
+    or an empty dict if the request failed.
     """
-    # Skip common company/service provider names that shouldn't be hyperlinked
-    skip_companies = {
-        'budget', 'hertz', 'avis', 'enterprise', 'thrifty', 'national', 'alamo', 'dollar', 'sixt',
-        'marriott', 'hilton', 'hyatt', 'sheraton', 'holiday inn', 'best western', 'radisson',
-        'airbnb', 'booking.com', 'expedia', 'hotels.com', 'tripadvisor',
-        'uber', 'lyft', 'grab', 'ola', 'bolt',
-        'mcdonald', 'starbucks', 'kfc', 'subway', 'pizza hut', 'domino',
-        'walmart', 'target', 'costco', 'tesco', 'carrefour'
+    params = {
+        'action': 'query',
+        'titles': '|'.join(titles),
+        'redirects': '1',
+        'format': 'json',
+        'formatversion': '2'
+    }
+    try:
+        async with session.get(WIKIPEDIA_API_URL, params=params, timeout=timeout(5)) as response:
+            if response.status != 200:
+                print(f'✗ Wikipedia API error: Status {response.status}')
+                return {}
+            data = await response.json()
+    except asyncio.TimeoutError:
+        print(f'✗ Wikipedia API timed out resolving {len(titles)} titles')
+        return {}
+    except Exception as e:
+        print(f'✗ Wikipedia API error: {e}')
+        return {}
+
+    query = data.get('query', {})
+    # A title may be normalized ("eiffel_tower" -> "Eiffel tower") and then
+    # redirected ("Eiffel tower" -> "Eiffel Tower") before reaching a page
+    renamed = {item['from']: item['to'] for item in query.get('normalized', [])}
+    fragments = {}
+    for item in query.get('redirects', []):
+        renamed[item['from']] = item['to']
+        if item.get('tofragment'):
+            fragments[item['to']] = item['tofragment']
+    existing = {
+        page['title'] for page in query.get('pages', [])
+        if not page.get('missing') and not page.get('invalid')
     }
 
-    if not nlp:
-        # Fallback to regex if spaCy not available
-        return extract_attraction_name_regex(activity)
-
-    doc = nlp(activity)
-
-    # First, try to find named entities (GPE, LOC, FAC, ORG)
-    # These are proper nouns that spaCy recognizes as places/landmarks
-    candidates = []
-
-    for ent in doc.ents:
-        # Look for location-related entities
-        if ent.label_ in ['GPE', 'LOC', 'FAC', 'ORG', 'PERSON']:
-            text = ent.text.strip()
-            # Skip if it's a known company/service provider
-            if text.lower() in skip_companies:
-                continue
-            # Filter out common non-landmark words
-            if len(text) > 3 and len(text) < 60:
-                # Skip if it's just a time or date
-                if ent.label_ not in ['DATE', 'TIME', 'CARDINAL', 'ORDINAL']:
-                    candidates.append((text, ent.start_char, ent.label_))
-
-    # If we found entities, prefer FAC > LOC > GPE > ORG
-    if candidates:
-        # Sort by priority (FAC first, then LOC, GPE, ORG, PERSON last)
-        priority = {'FAC': 0, 'LOC': 1, 'GPE': 2, 'ORG': 3, 'PERSON': 4}
-        candidates.sort(key=lambda x: (priority.get(x[2], 10), x[1]))
-        return candidates[0][0]
-
-    # If no entities found, look for consecutive proper nouns
-    # This catches cases like "Hell's Kitchen" that might not be recognized as entities
-    proper_nouns = []
-    current_phrase = []
-
-    for token in doc:
-        if token.pos_ == 'PROPN':
-            current_phrase.append(token.text)
-        else:
-            if current_phrase:
-                phrase = ' '.join(current_phrase)
-                # Skip if it's a known company/service provider
-                if phrase.lower() in skip_companies:
-                    current_phrase = []
-                    continue
-                # Skip action verbs at the start
-                action_verbs = ['Take', 'Visit', 'Explore', 'Enjoy', 'Experience', 'Discover',
-                               'Wander', 'Stroll', 'Ascend', 'Relax', 'Browse', 'Witness',
-                               'Find', 'Dive', 'Immerse', 'Have', 'Walk']
-                if phrase not in action_verbs and len(phrase) > 3:
-                    proper_nouns.append(phrase)
-                current_phrase = []
-
-    # Don't forget the last phrase if sentence ends with proper nouns
-    if current_phrase:
-        phrase = ' '.join(current_phrase)
-        if len(phrase) > 3:
-            proper_nouns.append(phrase)
-
-    # Return the first valid proper noun phrase
-    if proper_nouns:
-        return proper_nouns[0]
-
-    # Final fallback to regex-based extraction
-    return extract_attraction_name_regex(activity)
-
-
-def extract_attraction_name_regex(activity: str) -> str:
+    links = {}
+    for title in titles:
+        resolved = title
+        # Bounded, in case the response ever contains a cycle
+        for _ in range(len(renamed)):
+            if resolved not in renamed:
+                break
+            resolved = renamed[resolved]
+
+        links[title] = None
+        if resolved in existing:
+            links[title] = wikipedia_url(resolved)
+            if resolved in fragments:
+                links[title] += '#' + urllib.parse.quote(fragments[resolved].replace(' ', '_'), safe='_')
+
+    if WIKI_CACHE_ENABLED:
+        cache_links(links)
+    return links
+
+
+PERIODS = ('morning', 'afternoon', 'evening')
+
+
+def activity_strings(itinerary: dict) -> list:
+    """Every distinct activity string in the itinerary, in order."""
+    activities = {}
+    for day in itinerary.values():
+        for period in PERIODS:
+            if isinstance(day.get(period), list):
+                activities.update((activity, None) for activity in day[period] if isinstance(activity, str))
+    return list(activities)
+
+
+def activity_candidates(activities, names: dict) -> dict:
     """
-    Fallback regex-based extraction when spaCy is not available or doesn't find entities.
+    Attraction names worth linking in a period's activities, as {activity: name}.
     """
-    # Pattern 1: Look for landmark names with specific suffixes
-    landmark_pattern = r'(?:the\s+)?([A-Z][\w\'\s-]+?(?:Temple|Shrine|Museum|Tower|Palace|Castle|Park|Garden|Gardens|Square|Market|Building|Hills|Observatory|Crossing|Street|Gate|Hall|Center|Centre|District|Skytree|Bridge|River|Station|Memorial|Statue|Theatre|Island|Kitchen))'
-    match = re.search(landmark_pattern, activity)
-    if match:
-        place = match.group(1).strip()
-        place = re.sub(r',.*$', '', place)
-        if 4 < len(place) < 60:
-            return place
-
-    # Pattern 2: Look for "of/in/at/to [Place]" patterns
-    context_pattern = r'(?:of|in|at|from|to)\s+(?:the\s+)?([A-Z][\w\'\s-]+(?:\s+(?:and|&)\s+[A-Z][\w\'\s-]+)?)'
-    context_match = re.search(context_pattern, activity)
-    if context_match:
-        place = context_match.group(1).strip()
-        # Clean up trailing words
-        place = re.sub(r'\s+(?:and\s+[a-z].*|area|region)$', '', place, flags=re.IGNORECASE)
-        if len(place) > 3 and len(place) < 60:
-            return place
-
-    # Pattern 3: Match proper noun phrases (2-5 capitalized words, including apostrophes)
-    proper_noun_pattern = r'([A-Z][\w\']+(?:\s+[A-Z][\w\']+){1,4})'
-    matches = re.findall(proper_noun_pattern, activity)
-    if matches:
-        for place in matches:
-            place = place.strip()
-            # Filter out verb phrases
-            action_verbs = ['Take', 'Visit', 'Explore', 'Enjoy', 'Experience', 'Discover',
-                           'Wander', 'Stroll', 'Ascend', 'Relax', 'Browse', 'Witness',
-                           'Find', 'Dive', 'Immerse', 'Have', 'Walk']
-            if place.split()[0] not in action_verbs and 5 < len(place) < 60:
-                return place
-
-    return None
-
-
-async def process_activities(activities, session: aiohttp.ClientSession):
+    if not isinstance(activities, list):
+        return {}
+
+    candidates = {}
+    for activity in activities:
+        attraction_name = names.get(activity) if isinstance(activity, str) else None
+        # Only link names that were extracted with some confidence
+        if attraction_name and len(attraction_name) > 4:
+            candidates[activity] = attraction_name
+    return candidates
+
+
+def process_activities(activities, candidates: dict, links: dict):
     """
-    Process activities to add Wikipedia links.
+    Turn activity strings into activity objects, with a Wikipedia link where one was found.
     """
     if not activities:
         return activities
@@ -196,11 +227,11 @@ async def process_activities(activities, session: aiohttp.ClientSession):
 
         for activity in activities:
             if isinstance(activity, str):
-                attraction_name = extract_attraction_name(activity)
+                attraction_name = candidates.get(activity)
 
                 # Only create Wikipedia link if we successfully extracted an attraction name
-                if attraction_name and len(attraction_name) > 4:
-                    wiki_link = await get_wikipedia_link(attraction_name, session)
+                if attraction_name:
+                    wiki_link = links.get(attraction_name)
 
                     if wiki_link:
                         print(f'✓ Verified Wikipedia link for "{attraction_name}": {wiki_link}')
@@ -220,38 +251,45 @@ async def process_activities(activities, session: aiohttp.ClientSession):
     return activities
 
 
-async def add_wikipedia_links(itinerary: dict) -> dict:
+def link_candidates(itinerary: dict, names: dict) -> tuple:
     """
-    Add Wikipedia links to locations and attractions in the itinerary.
-    Uses async HTTP requests for faster processing.
+    Attraction names worth linking in each day's periods, as
+    {day_key: {period: {activity: name}}}, and every title to look up for
+    them (day locations included).
     """
-    # If raw format, return as is
-    if 'raw' in itinerary:
-        return itinerary
+    candidates = {
+        day_key: {period: activity_candidates(day.get(period), names) for period in PERIODS}
+        for day_key, day in itinerary.items()
+    }
+    titles = [day['location'] for day in itinerary.values() if day.get('location')]
+    for periods in candidates.values():
+        for period_names in periods.values():
+            titles.extend(period_names.values())
+    return candidates, titles
 
-    updated_itinerary = {}
 
-    # Create a single aiohttp session for all requests (connection pooling)
-    timeout = aiohttp.ClientTimeout(total=30)  # Overall timeout for all wiki requests
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        for day_key, day in itinerary.items():
-            updated_itinerary[day_key] = {**day}
-
-            # If this day has a location, create Wikipedia link
-            if 'location' in day and day['location']:
-                wiki_link = await get_wikipedia_link(day['location'], session)
-                if wiki_link:
-                    updated_itinerary[day_key]['location_wiki'] = wiki_link
-                    print(f'✓ Verified Wikipedia link for {day["location"]}: {wiki_link}')
-                else:
-                    print(f'✗ No valid Wikipedia page found for location "{day["location"]}"')
-
-            # Process activities for morning, afternoon, and evening
-            if 'morning' in day:
-                updated_itinerary[day_key]['morning'] = await process_activities(day['morning'], session)
-            if 'afternoon' in day:
-                updated_itinerary[day_key]['afternoon'] = await process_activities(day['afternoon'], session)
-            if 'evening' in day:
-                updated_itinerary[day_key]['evening'] = await process_activities(day['evening'], session)
+def apply_wikipedia_links(itinerary: dict, candidates: dict, links: dict) -> dict:
+    """
+    Copy of the itinerary with resolved links added to day locations and activities.
+    """
+    updated_itinerary = {}
+    for day_key, day in itinerary.items():
+        updated_itinerary[day_key] = {**day}
+
+        # If this day has a location, add its Wikipedia link
+        if 'location' in day and day['location']:
+            wiki_link = links.get(day['location'])
+            if wiki_link:
+                updated_itinerary[day_key]['location_wiki'] = wiki_link
+                print(f'✓ Verified Wikipedia link for {day["location"]}: {wiki_link}')
+            else:
+                print(f'✗ No valid Wikipedia page found for location "{day["location"]}"')
+
+        # Process activities for morning, afternoon, and evening
+        for period in PERIODS:
+            if period in day:
+                updated_itinerary[day_key][period] = process_activities(
+                    day[period], candidates[day_key][period], links
+                )
 
     return updated_itinerary
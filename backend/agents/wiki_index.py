@@ -0,0 +1,285 @@
+import os
+import sys
+import gzip
+import heapq
+import mmap
+import time
+import struct
+import shutil
+import argparse
+import tempfile
+import itertools
+import threading
+import urllib.request
+from array import array
+from agents.cache_store import INSTANCE_DIR
+
+# Offline index of English Wikipedia titles (articles and redirects), built from
+# the "all titles in namespace 0" dump, so links can be checked without the
+# network. The sorted file is memory-mapped and binary searched by every worker.
+DEFAULT_INDEX_PATH = os.path.join(INSTANCE_DIR, 'wiki_titles.idx')
+TITLES_DUMP_URL = 'https://dumps.wikimedia.org/enwiki/latest/enwiki-latest-all-titles-in-ns0.gz'
+
+# File layout: header, count + 1 record offsets into the data block, then the
+# records, each "title\0redirect target" (target empty for articles), sorted by title
+MAGIC = b'WIKIIDX1'
+HEADER = struct.Struct('<8sI')
+OFFSET = struct.Struct('<I')
+
+MAX_REDIRECT_HOPS = 3
+RUN_SIZE = 1_000_000  # Titles sorted in memory at a time while building
+
+
+def normalize_title(title: str) -> str:
+    """
+    Title in the form used by the dumps: single underscores for whitespace and
+    an uppercase first letter (the rest of a title is case sensitive).
+    """
+    title = '_'.join(title.replace('_', ' ').split())
+    return title[:1].upper() + title[1:]
+
+
+class WikiTitleIndex:
+    """Read-only, memory-mapped view of an index file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mtime = os.fstat(f.fileno()).st_mtime_ns
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a Wikipedia title index')
+        self._data_start = HEADER.size + OFFSET.size * (self.count + 1)
+
+    def __len__(self):
+        return self.count
+
+    def _record(self, i: int) -> bytes:
+        start, = OFFSET.unpack_from(self._map, HEADER.size + OFFSET.size * i)
+        end, = OFFSET.unpack_from(self._map, HEADER.size + OFFSET.size * (i + 1))
+        return self._map[self._data_start + start:self._data_start + end]
+
+    def _find(self, key: bytes):
+        """Redirect target of a title (b'' for an article), or None if absent."""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            title, _, target = self._record(middle).partition(b'\0')
+            if title < key:
+                low = middle + 1
+            elif title > key:
+                high = middle
+            else:
+                return target
+        return None
+
+    def resolve(self, title: str):
+        """
+        Canonical title of the article a title leads to (following redirects
+        listed in the index), or None if there is no such page.
+        """
+        key = normalize_title(title).encode('utf-8')
+        target = self._find(key)
+        if target is None:
+            return None
+
+        hops = 0
+        while target and hops < MAX_REDIRECT_HOPS:
+            key = target
+            # A target missing from the dump is still trusted as the article
+            target = self._find(key)
+            hops += 1
+
+        return key.decode('utf-8').replace('_', ' ')
+
+    def __contains__(self, title: str):
+        return self._find(normalize_title(title).encode('utf-8')) is not None
+
+    def close(self):
+        self._map.close()
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def load_index(path: str):
+    """
+    The index at path, reopened whenever the file has been rebuilt.
+    Returns None if there is no usable index there.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    with _lock:
+        index = _indexes.get(path)
+        if index is not None and index.mtime == mtime:
+            return index
+        try:
+            # The previous map is left to the garbage collector, since other
+            # threads may still be reading it
+            index = WikiTitleIndex(path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f'✗ Could not load the Wikipedia title index {path}: {e}')
+            index = None
+        _indexes[path] = index
+        return index
+
+
+def read_lines(path: str):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line:
+                yield line
+
+
+def read_redirects(path: str) -> dict:
+    redirects = {}
+    for line in read_lines(path):
+        source, _, target = line.partition('\t')
+        if source and target:
+            redirects[normalize_title(source).encode('utf-8')] = normalize_title(target).encode('utf-8')
+    return redirects
+
+
+def write_run(titles: set, directory: str) -> str:
+    """Write a batch of titles to a temporary file, sorted, one per line."""
+    with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False) as f:
+        for title in sorted(titles):
+            f.write(title + b'\n')
+    return f.name
+
+
+def read_run(path: str):
+    with open(path, 'rb') as f:
+        for line in f:
+            yield line[:-1]
+
+
+def sorted_titles(titles, directory: str, run_size: int = RUN_SIZE):
+    """
+    The distinct titles in sorted order. Runs of run_size titles are sorted in
+    memory and written to directory, then merged, so the whole dump never has
+    to fit in memory at once.
+    """
+    runs = []
+    batch = set()
+    for title in titles:
+        batch.add(title)
+        if len(batch) >= run_size:
+            runs.append(write_run(batch, directory))
+            batch = set()
+    if batch:
+        runs.append(write_run(batch, directory))
+
+    previous = None
+    for title in heapq.merge(*(read_run(path) for path in runs)):
+        if title != previous:
+            yield title
+            previous = title
+
+
+def build_index(titles_path: str, output: str, redirects_path: str = None) -> int:
+    """
+    Build an index file from a titles dump and an optional redirects file.
+    The new index replaces the old one atomically. Returns the title count.
+    """
+    redirects = read_redirects(redirects_path) if redirects_path else {}
+    titles = itertools.chain(
+        (
+            normalize_title(line).encode('utf-8')
+            for line in read_lines(titles_path)
+            if line != 'page_title'  # Header line of the dump
+        ),
+        redirects
+    )
+
+    offsets = array('I', [0])
+    temp_path = f'{output}.tmp'
+    output_dir = os.path.dirname(os.path.abspath(output))
+    os.makedirs(output_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=output_dir) as work_dir:
+        # The offset table comes first but its size is only known at the end,
+        # so the records go to a separate file that is copied in afterwards
+        records_path = os.path.join(work_dir, 'records')
+        with open(records_path, 'wb') as records:
+            position = 0
+            for title in sorted_titles(titles, work_dir):
+                if not title:
+                    continue
+                record = title + b'\0' + redirects.get(title, b'')
+                records.write(record)
+                position += len(record)
+                if position >= 2 ** 32:
+                    raise ValueError('Title data exceeds the 4 GiB index format limit')
+                offsets.append(position)
+
+        count = len(offsets) - 1
+        with open(temp_path, 'wb') as f, open(records_path, 'rb') as records:
+            f.write(HEADER.pack(MAGIC, count))
+            if sys.byteorder != 'little':
+                offsets.byteswap()
+            offsets.tofile(f)
+            shutil.copyfileobj(records, f, 1 << 20)
+
+    os.replace(temp_path, output)
+    return count
+
+
+def download(url: str, path: str):
+    print(f'Downloading {url}')
+    temp_path = f'{path}.part'
+    with urllib.request.urlopen(url) as response, open(temp_path, 'wb') as f:
+        while chunk := response.read(1 << 20):
+            f.write(chunk)
+    os.replace(temp_path, path)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Build or query the offline Wikipedia title index.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='Build the index from a titles dump')
+    build.add_argument('--titles', help='all-titles-in-ns0 dump (plain or .gz)')
+    build.add_argument('--download', action='store_true', help='Download the latest titles dump first')
+    build.add_argument('--redirects', help='Optional "redirect<TAB>target" file (plain or .gz)')
+    build.add_argument('--output', default=os.getenv('WIKI_INDEX_PATH') or DEFAULT_INDEX_PATH, help='Index file to write')
+
+    lookup = commands.add_parser('lookup', help='Resolve titles against the index')
+    lookup.add_argument('titles', nargs='+')
+    lookup.add_argument('--index', default=os.getenv('WIKI_INDEX_PATH') or DEFAULT_INDEX_PATH)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        titles_path = args.titles
+        if args.download:
+            titles_path = titles_path or os.path.join(INSTANCE_DIR, os.path.basename(TITLES_DUMP_URL))
+            download(TITLES_DUMP_URL, titles_path)
+        if not titles_path:
+            parser.error('build needs --titles or --download')
+
+        started = time.perf_counter()
+        count = build_index(titles_path, args.output, args.redirects)
+        print(f'✓ Indexed {count} titles into {args.output} in {time.perf_counter() - started:.1f}s')
+        return 0
+
+    index = load_index(args.index)
+    if index is None:
+        print(f'✗ No index at {args.index}; run "python -m agents.wiki_index build" first')
+        return 1
+    for title in args.titles:
+        started = time.perf_counter()
+        canonical = index.resolve(title)
+        print(f'{title!r} -> {canonical!r} ({(time.perf_counter() - started) * 1e6:.0f}µs)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
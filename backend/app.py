@@ -1,23 +1,39 @@
 import os
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from flask_jwt_extended import JWTManager
+import sys
+import types
 from dotenv import load_dotenv
+
+# The agent modules read their settings when they are imported, and
+# PROMETHEUS_MULTIPROC_DIR must be set before prometheus_client is, so .env has
+# to be loaded before any of the imports below
+load_dotenv()
+
+import json
+from flask import Flask, Response, g, request, jsonify
+from flask_cors import CORS
+from flask_jwt_extended import JWTManager, get_jwt_identity, verify_jwt_in_request
 from agents.itinerary_agent import itinerary_agent
 from agents.budget_agent import budget_agent
 from agents.booking_agent import booking_agent
-from agents.map_agent import map_agent
-from agents.wiki_agent import add_wikipedia_links
+from agents.enrichment import DayNames, enrich_itinerary
 from agents.weather_agent import weather_agent
 from agents.news_agent import news_agent
 from agents.chat_agent import chat_agent
+from agents.http_client import close_session
+from agents.singleflight import SingleFlight
+from agents.metrics import render as render_metrics, record_agent, time_agent
+from agents.tracing import AGENT, activate, finish_trace, instrument_sqlalchemy, span, start_trace
 from models import db
 from auth_routes import auth_bp
+from pipeline import Stage, run_pipeline
+from plan_cache import section_keys, lookup_sections, store_section
+from event_loop import run_async, submit
+from profiling import finish_profile, start_profile
+import time
+import atexit
 import asyncio
 from datetime import timedelta
 
-load_dotenv()
-
 app = Flask(__name__)
 CORS(app)
 
@@ -40,6 +56,7 @@ app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=30)
 # Initialize extensions
 db.init_app(app)
 jwt = JWTManager(app)
+instrument_sqlalchemy()
 
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -51,55 +68,278 @@ with app.app_context():
     db.create_all()
     print('✓ Database initialized')
 
+# Close pooled upstream connections cleanly when the worker exits
+atexit.register(lambda: run_async(close_session(), timeout=5))
+
+
+@app.before_request
+def begin_trace():
+    route = request.url_rule.rule if request.url_rule else request.path
+    g.trace_root = start_trace(f'{request.method} {route}', **{'http.method': request.method, 'http.route': route})
+
+
+@app.after_request
+def add_server_timing(response):
+    root = g.get('trace_root')
+    # Streamed responses have sent their headers before the work is done;
+    # their trace is finished by the stream itself
+    if root is not None and not g.get('streaming'):
+        finish_trace(root)
+        response.headers['Server-Timing'] = root.trace.server_timing()
+        response.headers['Timing-Allow-Origin'] = '*'
+    return response
+
+
+@app.teardown_request
+def end_trace(error=None):
+    # Covers requests that failed before after_request ran
+    if not g.get('streaming'):
+        finish_trace(g.get('trace_root'), error)
+
+
+def profile_requested() -> bool:
+    """
+    Whether the request asked to be profiled with X-Profile: 1. Only honoured
+    in debug mode or for signed-in users, so anonymous clients can't fill the
+    disk with profile files.
+    """
+    if request.headers.get('X-Profile') != '1':
+        return False
+    if app.debug:
+        return True
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity() is not None
+    except Exception:
+        return False
+
+
+@app.before_request
+def begin_profile():
+    route = request.url_rule.rule if request.url_rule else request.path
+    g.profile = start_profile(f'{request.method} {route}', requested=profile_requested())
+
+
+@app.after_request
+def attach_profile(response):
+    if not g.get('streaming'):
+        path = finish_profile(g.get('profile'))
+        if path:
+            response.headers['X-Profile'] = os.path.basename(path)
+    return response
+
+
+@app.teardown_request
+def end_profile(error=None):
+    if not g.get('streaming'):
+        finish_profile(g.get('profile'))
+
+
+def parse_trip_request(data: dict) -> dict:
+    """
+    Pull the trip planning parameters out of a /plan-trip request body.
+    """
+    return {
+        'country': data.get('country'),
+        'locations': data.get('locations'),  # Optional, comma-separated cities
+        'days': data.get('days', 3),
+        'origin': data.get('origin', 'LAX'),
+        'additional_details': data.get('additionalDetails'),
+        'detail_level': data.get('detailLevel', 'standard')  # quick, standard, or comprehensive
+    }
+
+
+def format_sse(event: str, data) -> str:
+    """
+    Format a single Server-Sent Event with a JSON payload.
+    """
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+# Response key (and SSE event name) for each pipeline stage
+SECTION_NAMES = {
+    'itinerary_agent': 'itineraryDraft',
+    'budget_agent': 'budget',
+    'booking_agent': 'bookings',
+    'weather_agent': 'weather',
+    'news_agent': 'news',
+    # Wikipedia links and map data come from one shared enrichment pass
+    'enrich_itinerary': ('itinerary', 'mapData')
+}
+
+
+def stage_sections(name: str, result) -> dict:
+    """Response sections produced by a stage, by section name."""
+    section = SECTION_NAMES[name]
+    if isinstance(section, tuple):
+        return {key: result[key] for key in section}
+    return {section: result}
+
+
+def section_list(name: str) -> tuple:
+    """Names of the response sections a stage produces."""
+    section = SECTION_NAMES[name]
+    return section if isinstance(section, tuple) else (section,)
+
+
+def build_trip_pipeline(params: dict, on_day=None, day_names: DayNames = None) -> list:
+    """
+    Agent pipeline for a trip plan. Each stage starts as soon as the
+    stages it depends on have finished.
+    on_day(day_key, day) is called as each itinerary day is generated.
+    Attraction names are extracted from each day as it arrives into
+    day_names, which the caller cancels once the pipeline is over.
+    """
+    country = params['country']
+    locations = params['locations']
+    days = params['days']
+    origin = params['origin']
+    additional_details = params['additional_details']
+
+    def start_day_names(day_key, day):
+        # Extract day 1's names while later days are still streaming in
+        if day_names is not None and isinstance(day, dict):
+            day_names.start(day_key, day)
+        if on_day:
+            on_day(day_key, day)
+
+    return [
+        Stage('itinerary_agent', lambda: itinerary_agent(country, locations, days, origin,
+                                                         additional_details, params['detail_level'],
+                                                         on_day=start_day_names)),
+        Stage('budget_agent', lambda: budget_agent(country, locations, days, origin, additional_details)),
+        Stage('booking_agent', lambda: booking_agent(country, locations, days, origin)),
+        Stage('weather_agent', lambda: weather_agent(country, locations, days)),
+        Stage('news_agent', lambda: news_agent(country, locations)),
+        # Wikipedia links and map data only need the itinerary
+        Stage('enrich_itinerary', lambda itinerary: enrich_itinerary(country, itinerary, locations, day_names),
+              deps=('itinerary_agent',))
+    ]
+
+
+# Identical plans (and identical sections of different plans) arriving at the
+# same time share one computation instead of each fanning out to every agent
+plan_flight = SingleFlight('plan')
+section_flight = SingleFlight('section')
+
+
+def coalesce_stage(stage: Stage, key: str, shared: bool = True) -> Stage:
+    """
+    Wrap a stage so concurrent runs with the same section key share one call,
+    or, when not shared, so the run always makes its own call.
+
+    Only the call that runs the agent observes its duration (as ok or error);
+    calls that waited on it are observed as coalesced.
+    """
+    async def timed(args):
+        with time_agent(stage.name):
+            return await stage.func(*args)
+
+    async def run(*args):
+        if not shared:
+            return await timed(args)
+
+        started = False
+
+        def start():
+            nonlocal started
+            started = True
+            return timed(args)
+
+        waited_from = time.perf_counter()
+        try:
+            return await section_flight.do((stage.name, key), start)
+        finally:
+            if not started:
+                record_agent(stage.name, 'coalesced', time.perf_counter() - waited_from)
+
+    return Stage(stage.name, run, stage.deps)
+
+
+async def run_trip_pipeline(params: dict, on_complete=None, on_day=None) -> tuple:
+    """
+    Run the trip pipeline, reusing cached sections that are still fresh and
+    caching the ones that had to be recomputed.
+    Returns the pipeline run and the names of the sections served from cache.
+    """
+    keys = section_keys(params)
+    day_names = DayNames()
+
+    # Days are only streamed to the run that started the itinerary call, so a
+    # run that streams them generates its own itinerary, and links and maps
+    # that one rather than another run's
+    unshared = {'itinerary_agent'} if on_day else set()
+    stages = []
+    for stage in build_trip_pipeline(params, on_day, day_names):
+        shared = stage.name not in unshared and unshared.isdisjoint(stage.deps)
+        if not shared:
+            unshared.add(stage.name)
+        stages.append(coalesce_stage(stage, keys[stage.name], shared))
+    cached = lookup_sections(stages, keys)
+    for name in cached:
+        record_agent(name, 'cached', 0)
+
+    def cache_and_forward(name, result, error):
+        if error is None and name not in cached:
+            store_section(keys, name, result)
+        if on_complete:
+            on_complete(name, result, error)
+
+    try:
+        run = await run_pipeline(stages, cache_and_forward, cached=cached)
+    finally:
+        # Days whose itinerary was never enriched (it failed, or enrichment was cached)
+        day_names.cancel()
+    return run, set(cached)
+
+
+def cache_status(stages_cached: set) -> str:
+    """Summarize plan cache usage for the X-Plan-Cache header."""
+    if not stages_cached:
+        return 'miss'
+    if len(stages_cached) == len(SECTION_NAMES):
+        return 'hit'
+    return 'partial'
+
 
 @app.route('/plan-trip', methods=['POST'])
 def plan_trip():
     try:
-        data = request.get_json()
-        country = data.get('country')
-        locations = data.get('locations')  # Optional, comma-separated cities
-        days = data.get('days', 3)
-        origin = data.get('origin', 'LAX')
-        additional_details = data.get('additionalDetails')
-        detail_level = data.get('detailLevel', 'standard')  # quick, standard, or comprehensive
-
-        if not country:
+        params = parse_trip_request(request.get_json())
+
+        if not params['country']:
             return jsonify({'error': 'Country is required'}), 400
 
-        # Run all agents in parallel using asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        # First batch: Run initial agents in parallel
-        itinerary_raw, budget, bookings, weather, news = loop.run_until_complete(
-            asyncio.gather(
-                itinerary_agent(country, locations, days, origin, additional_details, detail_level),
-                budget_agent(country, locations, days, origin, additional_details),
-                booking_agent(country, locations, days, origin),
-                weather_agent(country, locations, days),
-                news_agent(country, locations)
-            )
-        )
-
-        # Second batch: Run Wikipedia links and map data in parallel
-        # (both depend on itinerary)
-        itinerary, map_data = loop.run_until_complete(
-            asyncio.gather(
-                add_wikipedia_links(itinerary_raw),
-                map_agent(country, itinerary_raw, locations)
-            )
-        )
+        # Run all agents through the dependency-aware pipeline on the shared loop,
+        # only recomputing sections that are missing from the cache or expired
+        plan_key = tuple(sorted(section_keys(params).values()))
+        run, stages_cached = run_async(plan_flight.do(plan_key, lambda: run_trip_pipeline(params)))
 
-        loop.close()
+        print(f'⏱ Critical path: {run.format_critical_path()}')
+
+        if run.errors:
+            # Report the stage that actually failed, not the ones skipped because of it
+            name, err = next(
+                ((n, e) for n, e in run.errors.items() if n in run.timings),
+                next(iter(run.errors.items()))
+            )
+            raise RuntimeError(f'{name} failed: {err}') from err
 
-        return jsonify({
-            'itinerary': itinerary,
-            'budget': budget,
-            'bookings': bookings,
-            'mapData': map_data,
-            'weather': weather,
-            'news': news
+        sections = {}
+        for name, result in run.results.items():
+            sections.update(stage_sections(name, result))
+        response = jsonify({
+            'itinerary': sections['itinerary'],
+            'budget': sections['budget'],
+            'bookings': sections['bookings'],
+            'mapData': sections['mapData'],
+            'weather': sections['weather'],
+            'news': sections['news']
         })
+        response.headers['X-Critical-Path'] = run.format_critical_path()
+        response.headers['X-Stage-Timings'] = run.format_timings()
+        response.headers['X-Plan-Cache'] = cache_status(stages_cached)
+        return response
 
     except Exception as err:
         import traceback
@@ -108,6 +348,93 @@ def plan_trip():
         return jsonify({'error': 'Failed to plan trip', 'details': str(err)}), 500
 
 
+@app.route('/plan-trip/stream', methods=['POST'])
+def plan_trip_stream():
+    """
+    Streaming variant of /plan-trip. Sends each section as a Server-Sent Event
+    as soon as its agent finishes, followed by a final 'done' event.
+    """
+    params = parse_trip_request(request.get_json() or {})
+
+    if not params['country']:
+        return jsonify({'error': 'Country is required'}), 400
+
+    # The generator runs after the request context is gone, so hand it the
+    # trace and profile to finish when the stream ends
+    g.streaming = True
+    trace_root = g.get('trace_root')
+    profile = g.get('profile')
+
+    def generate():
+        # Only touched from the shared loop's thread
+        events = asyncio.Queue()
+
+        def on_complete(name, result, error):
+            if error is None:
+                for section, value in stage_sections(name, result).items():
+                    events.put_nowait(format_sse(section, value))
+                return
+
+            for section in section_list(name):
+                print(f'Error streaming {section}: {error}')
+                events.put_nowait(format_sse('error', {'section': section, 'details': str(error)}))
+
+        def on_day(day_key, day):
+            events.put_nowait(format_sse('itineraryDay', {'day': day_key, 'data': day}))
+
+        async def run_and_close():
+            try:
+                return await run_trip_pipeline(params, on_complete, on_day)
+            finally:
+                # Wake the reader up once the pipeline is over
+                events.put_nowait(None)
+
+        with activate(trace_root):
+            pipeline_future = submit(run_and_close())
+
+        try:
+            while True:
+                event = run_async(events.get())
+                if event is None:
+                    break
+                yield event
+
+            try:
+                run, stages_cached = pipeline_future.result()
+            except Exception as err:
+                # The pipeline itself failed, so there are no timings to report
+                import traceback
+                print(f'Error planning trip: {err}')
+                traceback.print_exc()
+                yield format_sse('error', {'error': 'Failed to plan trip', 'details': str(err)})
+                return
+
+            print(f'⏱ Critical path: {run.format_critical_path()}')
+            yield format_sse('done', {
+                'criticalPath': run.critical_path(),
+                'timings': run.durations(),
+                'cached': sorted(section for name in stages_cached for section in section_list(name))
+            })
+
+        finally:
+            # Client disconnected or something failed: don't leave agents running
+            pipeline_future.cancel()
+            finish_trace(trace_root)
+            finish_profile(profile)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: agent latencies, upstream and LLM calls, parse failures, cache hit ratios."""
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+
 @app.route('/chat', methods=['POST'])
 def chat():
     try:
@@ -118,15 +445,9 @@ def chat():
         if not user_message:
             return jsonify({'error': 'Message is required'}), 400
 
-        # Run chat agent
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-        chat_response = loop.run_until_complete(
-            chat_agent(user_message, current_trip)
-        )
-
-        loop.close()
+        # Run chat agent on the shared loop
+        with span('chat_agent', AGENT), time_agent('chat_agent'):
+            chat_response = run_async(chat_agent(user_message, current_trip))
 
         return jsonify(chat_response)
 
@@ -138,6 +459,13 @@ def chat():
 
 
 if __name__ == '__main__':
+    # NLP worker processes are spawned, and a spawned child starts by re-running
+    # the parent's __main__ script, which would set the whole app up again in
+    # every worker. Keep this script as the `app` module instead and leave
+    # __main__ empty; the workers import everything they run by name
+    sys.modules['app'] = sys.modules['__main__']
+    sys.modules['__main__'] = types.ModuleType('__main__')
+
     print(f'Backend running on http://localhost:{PORT}')
-    # Increase timeout for processing large itineraries with detailed preferences
-    app.run(host='0.0.0.0', port=PORT, debug=True, threaded=True)
+    # Development server. For production use the ASGI entry point (see asgi.py)
+    app.run(host='0.0.0.0', port=PORT, debug=os.getenv('FLASK_DEBUG', '1') == '1', threaded=True)
@@ -0,0 +1,12 @@
+import os
+from a2wsgi import WSGIMiddleware
+from app import app as flask_app
+
+# Production entry point:
+#   uvicorn asgi:app --host 0.0.0.0 --port 4000 --workers 4
+#
+# Each uvicorn worker is a separate process with its own shared event loop
+# (see event_loop.py), so throughput scales with --workers. Within a worker,
+# Flask views (including the auth blueprint) run on a thread pool and hand
+# their agent work to that loop.
+app = WSGIMiddleware(flask_app, workers=int(os.getenv('ASGI_THREADS', 16)))
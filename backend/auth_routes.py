@@ -11,6 +11,16 @@ auth_bp = Blueprint('auth', __name__)
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID', '')
 
 
+def create_user_token(user: User) -> str:
+    """Access token for a user. PyJWT 2.10+ only accepts a string subject."""
+    return create_access_token(identity=str(user.id))
+
+
+def current_user_id() -> int:
+    """The authenticated user's id, whether the token's subject is a string or an older integer one."""
+    return int(get_jwt_identity())
+
+
 @auth_bp.route('/signup', methods=['POST'])
 def signup():
     """Register a new user with email and password"""
@@ -38,7 +48,7 @@ def signup():
         db.session.commit()
 
         # Create access token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_user_token(user)
 
         return jsonify({
             'message': 'User created successfully',
@@ -70,7 +80,7 @@ def login():
             return jsonify({'error': 'Invalid email or password'}), 401
 
         # Create access token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_user_token(user)
 
         return jsonify({
             'message': 'Login successful',
@@ -125,7 +135,7 @@ def google_auth():
                 db.session.commit()
 
             # Create access token
-            access_token = create_access_token(identity=user.id)
+            access_token = create_user_token(user)
 
             return jsonify({
                 'message': 'Google authentication successful',
@@ -148,7 +158,7 @@ def google_auth():
 def get_profile():
     """Get current user's profile"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         user = User.query.get(user_id)
 
         if not user:
@@ -166,7 +176,7 @@ def get_profile():
 def update_profile():
     """Update user profile"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         user = User.query.get(user_id)
 
         if not user:
@@ -218,7 +228,7 @@ def update_profile():
 def save_trip():
     """Save a trip to user's account"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         data = request.get_json()
 
         # Required fields
@@ -267,7 +277,7 @@ def save_trip():
 def get_trips():
     """Get all saved trips for current user"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
 
         # Get trips ordered by most recent
         trips = SavedTrip.query.filter_by(user_id=user_id).order_by(
@@ -289,7 +299,7 @@ def get_trips():
 def get_trip(trip_id):
     """Get a specific trip with full data"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
 
         trip = SavedTrip.query.filter_by(id=trip_id, user_id=user_id).first()
 
@@ -310,7 +320,7 @@ def get_trip(trip_id):
 def update_trip(trip_id):
     """Update a saved trip"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         trip = SavedTrip.query.filter_by(id=trip_id, user_id=user_id).first()
 
         if not trip:
@@ -344,7 +354,7 @@ def update_trip(trip_id):
 def delete_trip(trip_id):
     """Delete a saved trip"""
     try:
-        user_id = get_jwt_identity()
+        user_id = current_user_id()
         trip = SavedTrip.query.filter_by(id=trip_id, user_id=user_id).first()
 
         if not trip:
@@ -0,0 +1,205 @@
+"""
+Micro-benchmarks for the text-extraction hot paths that run on every activity
+of every plan: extract_attraction_name / extract_attraction_name_regex
+(extraction) and extract_place_name / extract_attractions (map_agent).
+extract_attractions is measured with the activity-name cache off and with it
+warm, as it is for activities that earlier plans already contained.
+The wiki.itinerary benchmarks compare extracting a whole itinerary's names one
+string at a time (with the full and the trimmed spaCy pipeline) against the
+batched extract_attraction_names pass.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_extraction                   # compare against the baseline
+    python -m benchmarks.bench_extraction --update-baseline # record a new baseline
+
+Exits with status 1 if any benchmark is slower than its baseline by more than
+the tolerance, or if there is no baseline to compare against. Baselines are machine specific, so record one on the machine
+that runs the comparison.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import contextlib
+from benchmarks import corpus
+from agents import extraction, name_cache, wiki_agent
+from agents.map_agent import extract_attractions, extract_place_name
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+@contextlib.contextmanager
+def full_pipeline():
+    """Swap in en_core_web_sm with every component, as it was loaded before trimming."""
+    import spacy
+    nlp = extraction.get_nlp()
+    extraction.nlp = spacy.load(extraction.SPACY_MODEL)
+    try:
+        yield
+    finally:
+        extraction.nlp = nlp
+
+
+def names_per_string(itinerary: dict) -> list:
+    return [extraction.extract_attraction_name(activity) for activity in wiki_agent.activity_strings(itinerary)]
+
+
+def names_batched(itinerary: dict) -> list:
+    return extraction.extract_attraction_names(wiki_agent.activity_strings(itinerary))
+
+
+@contextlib.contextmanager
+def spacy_disabled():
+    """Force extract_attraction_name onto its regex fallback."""
+    nlp = extraction.get_nlp()
+    extraction.nlp = None
+    try:
+        yield
+    finally:
+        extraction.nlp = nlp
+
+
+@contextlib.contextmanager
+def name_cache_disabled():
+    """Extract every activity's names again instead of looking them up."""
+    enabled = name_cache.EXTRACTION_CACHE_ENABLED
+    name_cache.EXTRACTION_CACHE_ENABLED = False
+    try:
+        yield
+    finally:
+        name_cache.EXTRACTION_CACHE_ENABLED = enabled
+
+
+def measure(func, inputs: list, repeat: int) -> dict:
+    """
+    Time func over every input, repeat times after one warm-up pass.
+    Reports per-call latency (median and best pass) and throughput.
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for item in inputs:
+            func(item)
+
+        passes = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for item in inputs:
+                func(item)
+            passes.append((time.perf_counter() - start) / len(inputs))
+
+    median = statistics.median(passes)
+    return {
+        'calls': len(inputs),
+        'median_us': median * 1e6,
+        'best_us': min(passes) * 1e6,
+        'calls_per_sec': 1 / median if median else float('inf')
+    }
+
+
+def benchmarks(count: int, with_spacy: bool) -> list:
+    """(name, func, inputs, context) for every benchmark that can run here."""
+    activities = corpus.activities(count)
+    itineraries = corpus.itineraries(max(count // 30, 1))
+
+    cases = [
+        ('wiki.extract_attraction_name_regex', extraction.extract_attraction_name_regex, activities, contextlib.nullcontext),
+        ('wiki.extract_attraction_name[no-spacy]', extraction.extract_attraction_name, activities, spacy_disabled),
+        ('map.extract_place_name', extract_place_name, activities, contextlib.nullcontext),
+        ('map.extract_attractions', extract_attractions, itineraries, name_cache_disabled),
+        ('map.extract_attractions[memoized]', extract_attractions, itineraries, contextlib.nullcontext)
+    ]
+    if with_spacy and extraction.get_nlp() is not None:
+        cases[1:1] = [
+            ('wiki.extract_attraction_name[spacy]', extraction.extract_attraction_name, activities, contextlib.nullcontext),
+            ('wiki.itinerary[spacy-full,per-string]', names_per_string, itineraries, full_pipeline),
+            ('wiki.itinerary[spacy,per-string]', names_per_string, itineraries, contextlib.nullcontext),
+            ('wiki.itinerary[spacy,batched]', names_batched, itineraries, contextlib.nullcontext)
+        ]
+    elif with_spacy:
+        print('⚠️  spaCy model en_core_web_sm not available, skipping spaCy benchmarks')
+
+    return cases
+
+
+def load_baseline(path: str) -> dict:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def environment() -> dict:
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'spacy_model': extraction.get_nlp() is not None
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the activity text-extraction functions.')
+    parser.add_argument('--count', type=int, default=3000, help='Activity strings in the corpus')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed passes over the corpus per benchmark')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='Baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed slowdown against the baseline median (0.2 = 20%%)')
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline')
+    parser.add_argument('--no-spacy', action='store_true', help='Skip the benchmarks that need the spaCy model')
+    parser.add_argument('--only', help='Only run benchmarks whose name contains this text')
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.baseline)
+    expected = baseline.get('results', {})
+    if baseline and baseline.get('environment') != environment():
+        print('⚠️  Baseline was recorded in a different environment, comparisons may be noisy')
+
+    results = {}
+    regressions = []
+
+    cases = benchmarks(args.count, not args.no_spacy)
+    print(f'{"benchmark":<42} {"median µs":>10} {"best µs":>10} {"calls/s":>10} {"vs base":>9}')
+    for name, func, inputs, context in cases:
+        if args.only and args.only not in name:
+            continue
+
+        with context():
+            result = measure(func, inputs, args.repeat)
+        results[name] = result
+
+        change = ''
+        if name in expected and not args.update_baseline:
+            ratio = result['median_us'] / expected[name]['median_us'] - 1
+            change = f'{ratio:+.0%}'
+            if ratio > args.tolerance:
+                regressions.append(name)
+                change += ' ✗'
+
+        print(f'{name:<42} {result["median_us"]:>10.1f} {result["best_us"]:>10.1f} '
+              f'{result["calls_per_sec"]:>10.0f} {change:>9}')
+
+    if args.update_baseline:
+        # Keep entries for benchmarks that were filtered out or skipped this time
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'results': {**expected, **results}}, f, indent=2)
+        print(f'✓ Baseline written to {args.baseline}')
+        return 0
+
+    if not expected:
+        print(f'✗ No baseline at {args.baseline}; run with --update-baseline to record one')
+        return 1
+
+    if regressions:
+        print(f'✗ {len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}: {", ".join(regressions)}')
+        return 1
+
+    print('✓ No regressions against the baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Golden-corpus check for the rule-based extractors: extract_attraction_name_regex
+(extraction), and extract_place_name and clean_attraction_name (map_agent).
+golden_extraction.json holds activity strings with the names each function
+returned for them: generated activities, hand-written edge cases and random
+word soup. The outputs were recorded from the original regex cascades.
+
+Run from the backend directory:
+
+    python -m benchmarks.check_extraction           # compare against the golden corpus
+    python -m benchmarks.check_extraction --update  # re-record after an intended change
+
+Exits with status 1 if any output differs from the recorded one.
+"""
+import os
+import sys
+import json
+import argparse
+from agents.extraction import extract_attraction_name_regex
+from agents.map_agent import clean_attraction_name, extract_place_name
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden_extraction.json')
+
+
+def extract(activity: str) -> dict:
+    place = extract_place_name(activity)
+    return {
+        'attraction': extract_attraction_name_regex(activity),
+        'place': place,
+        'cleaned': clean_attraction_name(place) if place else None
+    }
+
+
+def load_golden(path: str = GOLDEN_PATH) -> list:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_golden(entries: list, path: str = GOLDEN_PATH):
+    # One entry per line keeps diffs of re-recorded outputs readable
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[\n')
+        f.write(',\n'.join(json.dumps(entry, ensure_ascii=False) for entry in entries))
+        f.write('\n]\n')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Check the place extractors against the golden corpus.')
+    parser.add_argument('--update', action='store_true', help='Re-record every output from the current code')
+    parser.add_argument('--path', default=GOLDEN_PATH)
+    parser.add_argument('--show', type=int, default=20, help='Differences to print')
+    args = parser.parse_args(argv)
+
+    entries = load_golden(args.path)
+
+    if args.update:
+        write_golden([{'activity': entry['activity'], **extract(entry['activity'])} for entry in entries], args.path)
+        print(f'✓ Re-recorded {len(entries)} entries in {args.path}')
+        return 0
+
+    failures = 0
+    for entry in entries:
+        actual = extract(entry['activity'])
+        differences = {field: value for field, value in actual.items() if entry.get(field) != value}
+        if differences:
+            failures += 1
+            if failures <= args.show:
+                print(f'✗ {entry["activity"]!r}')
+                for field, value in differences.items():
+                    print(f'    {field}: expected {entry.get(field)!r}, got {value!r}')
+
+    if failures:
+        print(f'✗ {failures} of {len(entries)} entries differ from the golden corpus')
+        return 1
+
+    print(f'✓ All {len(entries)} entries match the golden corpus')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import random
+
+# Building blocks for realistic itinerary activities. The mix follows what
+# Gemini actually returns: an action verb, an optional adjective, a landmark
+# (usually with a suffix like Temple or Market), and a trailing clause.
+VERBS = [
+    'Visit', 'Explore', 'Tour', 'See', 'Discover', 'Walk through', 'Stroll through', 'Wander through',
+    'Browse', 'Admire', 'Experience', 'Ascend', 'Enjoy', 'Immerse yourself in', 'Find tranquility at',
+    'Witness', 'Take a photo with', 'Relax and stroll through', 'Dive into the world of', 'Have lunch at'
+]
+ADJECTIVES = [
+    '', '', '', 'the ', 'the ', 'the beautiful ', 'the iconic ', 'the historic ', 'the vibrant ',
+    'the serene ', 'the world-famous ', 'the traditional ', 'the lively '
+]
+NAMES = [
+    'Senso-ji', 'Meiji', 'Fushimi Inari', 'Kinkaku-ji', 'Louvre', 'Prado', 'Uffizi', 'Eiffel',
+    'Tokyo', 'Kyoto', 'Shibuya', 'Shinjuku', 'Asakusa', 'Gion', 'Montmartre', 'Notre-Dame',
+    'Sagrada Familia', 'Park Guell', 'Colosseum', 'Trevi', 'Vatican', 'Brandenburg', 'Charles',
+    'Golden Gate', 'Central', 'Hyde', 'Tsukiji Outer', 'Nishiki', 'Ueno', 'Hell\'s', 'St. Mark\'s',
+    'Grand Bazaar', 'Blue Mosque', 'Hagia Sophia', 'Topkapi', 'Alhambra', 'Marina Bay',
+    'Gardens by the Bay', 'Chatuchak', 'Wat Arun', 'Grand Palace', 'Angkor', 'Petronas', 'Sydney Opera'
+]
+SUFFIXES = [
+    'Temple', 'Shrine', 'Museum', 'Tower', 'Palace', 'Castle', 'Park', 'Garden', 'Gardens', 'Square',
+    'Market', 'Building', 'Hills', 'Observatory', 'Crossing', 'Street', 'Gate', 'Hall', 'Center',
+    'District', 'Bridge', 'River', 'Station', 'Memorial', 'Statue', 'Theatre', 'Island', 'Kitchen'
+]
+CITIES = ['Tokyo', 'Kyoto', 'Osaka', 'Paris', 'Rome', 'Barcelona', 'Istanbul', 'Bangkok', 'New York', 'London']
+TAILS = [
+    '', '', '', ' for stunning views', ', one of the oldest landmarks in the city',
+    ' and learn about its history', ' dedicated to the local deity', ' known for its street food',
+    ', home to thousands of artifacts', ' at sunset', ' before the crowds arrive',
+    ' featuring seasonal exhibitions', ' including a guided tour of the grounds'
+]
+# Activities with no landmark in them at all
+GENERIC = [
+    'Relax at your hotel and rest before dinner',
+    'Enjoy a leisurely breakfast at a local cafe',
+    'Try authentic street food from the vendors nearby',
+    'Take a cooking class to learn regional dishes',
+    'Check out of the hotel and head to the airport',
+    'Free time for shopping and souvenirs',
+    'Dinner at a traditional izakaya with local specialties',
+    'Take the train to the next city'
+]
+
+
+def activity(rng: random.Random) -> str:
+    shape = rng.random()
+    if shape < 0.12:
+        return rng.choice(GENERIC)
+
+    landmark = f'{rng.choice(NAMES)} {rng.choice(SUFFIXES)}' if rng.random() < 0.8 else rng.choice(NAMES)
+    if shape < 0.25:
+        # "of/in/at [Place]" phrasing
+        return f'{rng.choice(["Take a boat ride", "Sample sweets", "Watch the sunset", "Shop for crafts"])} ' \
+               f'{rng.choice(["in", "at", "from", "near"])} {landmark}{rng.choice(TAILS)}'
+    if shape < 0.3:
+        return f'{rng.choice(VERBS)} {landmark} in {rng.choice(CITIES)}{rng.choice(TAILS)}'
+
+    return f'{rng.choice(VERBS)} {rng.choice(ADJECTIVES)}{landmark}{rng.choice(TAILS)}'
+
+
+def activities(count: int = 3000, seed: int = 42) -> list:
+    """A reproducible corpus of activity strings."""
+    rng = random.Random(seed)
+    return [activity(rng) for _ in range(count)]
+
+
+def itineraries(count: int = 200, days: int = 5, seed: int = 42) -> list:
+    """Reproducible itineraries in the shape itinerary_agent returns, for extract_attractions."""
+    rng = random.Random(seed)
+    plans = []
+    for _ in range(count):
+        plans.append({
+            f'day{n}': {
+                'location': rng.choice(CITIES),
+                'morning': [activity(rng) for _ in range(2)],
+                'afternoon': [activity(rng) for _ in range(2)],
+                'evening': [activity(rng) for _ in range(2)]
+            }
+            for n in range(1, days + 1)
+        })
+    return plans
@@ -0,0 +1,387 @@
+"""
+End-to-end load generator for /plan-trip, /chat and the saved-trip routes.
+
+By default it starts a throwaway backend against local stand-ins: the fake LLM
+provider (LLM_PROVIDER=fake), recorded external API traffic
+(HTTP_CASSETTE_MODE=replay) and a temporary SQLite database. It then drives
+the endpoints and reports latency percentiles, throughput and error rates per
+endpoint and per pipeline agent. Run from the backend directory:
+
+    python -m benchmarks.load_test --concurrency 16 --rate 4 --duration 60
+
+--rate 0 runs a closed loop (each of --concurrency clients sends its next
+request as soon as the previous one returns). Otherwise requests arrive as a
+Poisson process at --rate per second, and latency is measured from the
+scheduled arrival so queueing behind --concurrency is counted. Pass
+--target http://host:port to load an already running server instead.
+FAKE_LLM_* variables in the environment are passed through to the server.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import aiohttp
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COUNTRIES = {
+    'Japan': ['Tokyo', 'Kyoto', 'Osaka', 'Hiroshima', 'Nara'],
+    'Italy': ['Rome', 'Florence', 'Venice', 'Milan', 'Naples'],
+    'France': ['Paris', 'Lyon', 'Nice', 'Bordeaux'],
+    'Thailand': ['Bangkok', 'Chiang Mai', 'Phuket'],
+    'Spain': ['Madrid', 'Barcelona', 'Seville', 'Granada']
+}
+CHAT_MESSAGES = [
+    'Can you make day 2 more relaxed?',
+    'What should I pack for this trip?',
+    'Make it cheaper',
+    'Add a cooking class somewhere',
+    'Is it safe to walk around at night?'
+]
+
+
+def percentile(values: list, p: float) -> float:
+    """Nearest-rank percentile of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(-(-p * len(ordered) // 100)), 1)
+    return ordered[rank - 1]
+
+
+def parse_stage_timings(header: str) -> dict:
+    """Parse an X-Stage-Timings header ('itinerary_agent=1234, weather_agent=210') into ms per stage."""
+    timings = {}
+    for part in (header or '').split(','):
+        name, _, ms = part.strip().partition('=')
+        if name and ms:
+            try:
+                timings[name] = float(ms)
+            except ValueError:
+                continue
+    return timings
+
+
+class Stats:
+    """Latencies, status codes and errors per endpoint, and stage timings per agent."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+        self.agents = {}
+
+    def record(self, endpoint: str, seconds: float, status):
+        self.latencies.setdefault(endpoint, []).append(seconds * 1000)
+        counts = self.statuses.setdefault(endpoint, {})
+        counts[status] = counts.get(status, 0) + 1
+        if not isinstance(status, int) or status >= 400:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def record_agents(self, timings: dict):
+        for name, ms in timings.items():
+            self.agents.setdefault(name, []).append(ms)
+
+    def report(self, elapsed: float) -> dict:
+        def summary(values):
+            return {
+                'count': len(values),
+                'p50_ms': round(percentile(values, 50), 1),
+                'p95_ms': round(percentile(values, 95), 1),
+                'p99_ms': round(percentile(values, 99), 1),
+                'max_ms': round(max(values), 1) if values else 0.0
+            }
+
+        endpoints = {}
+        for endpoint, values in self.latencies.items():
+            endpoints[endpoint] = {
+                **summary(values),
+                'throughput_rps': round(len(values) / elapsed, 2) if elapsed else 0.0,
+                'error_rate': round(self.errors.get(endpoint, 0) / len(values), 4),
+                'statuses': {str(status): count for status, count in self.statuses[endpoint].items()}
+            }
+
+        return {
+            'elapsed_s': round(elapsed, 1),
+            'endpoints': endpoints,
+            'agents': {name: summary(values) for name, values in self.agents.items()}
+        }
+
+
+def print_report(report: dict):
+    header = f'{"":<34} {"count":>6} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"max ms":>9}'
+
+    print(f'\nEndpoints ({report["elapsed_s"]}s)')
+    print(f'{header} {"req/s":>7} {"errors":>7}')
+    for endpoint, row in sorted(report['endpoints'].items()):
+        print(f'{endpoint:<34} {row["count"]:>6} {row["p50_ms"]:>9.0f} {row["p95_ms"]:>9.0f} {row["p99_ms"]:>9.0f} '
+              f'{row["max_ms"]:>9.0f} {row["throughput_rps"]:>7.2f} {row["error_rate"]:>7.1%}')
+
+    if report['agents']:
+        print('\nAgents (/plan-trip stage timings)')
+        print(header)
+        for name, row in sorted(report['agents'].items()):
+            print(f'{name:<34} {row["count"]:>6} {row["p50_ms"]:>9.0f} {row["p95_ms"]:>9.0f} {row["p99_ms"]:>9.0f} '
+                  f'{row["max_ms"]:>9.0f}')
+
+
+class LoadTest:
+    def __init__(self, base_url: str, stats: Stats, seed: int):
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.random = random.Random(seed)
+        self.token = None
+        self.trip_ids = []
+
+    async def call(self, session, endpoint: str, method: str, path: str, started: float = None, **kwargs):
+        """Send one request and record it under endpoint. Returns (status, headers, body) or None."""
+        started = time.perf_counter() if started is None else started
+        try:
+            async with session.request(method, self.base_url + path, **kwargs) as response:
+                body = await response.read()
+                self.stats.record(endpoint, time.perf_counter() - started, response.status)
+                return response.status, response.headers, body
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.stats.record(endpoint, time.perf_counter() - started, type(e).__name__)
+            return None
+
+    def auth(self) -> dict:
+        return {'Authorization': f'Bearer {self.token}'}
+
+    async def setup(self, session, trips: int):
+        """Create a throwaway user with a few saved trips for the saved-trip routes."""
+        name = f'loadtest-{uuid.uuid4().hex[:10]}'
+        async with session.post(f'{self.base_url}/api/auth/signup', json={
+            'email': f'{name}@example.com', 'username': name, 'password': uuid.uuid4().hex
+        }) as response:
+            data = await response.json()
+            if response.status != 201:
+                raise RuntimeError(f'Could not create load test user: {data}')
+            self.token = data['access_token']
+
+        for n in range(trips):
+            result = await self.call(session, 'POST /api/auth/save-trip', 'POST', '/api/auth/save-trip',
+                                     headers=self.auth(), json=self.trip_payload(f'Load test trip {n + 1}'))
+            if result and result[0] == 201:
+                self.trip_ids.append(json.loads(result[2])['trip']['id'])
+
+    def trip_payload(self, name: str) -> dict:
+        country = self.random.choice(list(COUNTRIES))
+        return {
+            'trip_name': name,
+            'country': country,
+            'locations': ', '.join(self.random.sample(COUNTRIES[country], 2)),
+            'days': self.random.randint(2, 7),
+            'origin': 'New York',
+            'itinerary': {'day1': {'location': COUNTRIES[country][0], 'morning': ['Visit the old town']}}
+        }
+
+    async def plan_trip(self, session, started):
+        country = self.random.choice(list(COUNTRIES))
+        cities = self.random.sample(COUNTRIES[country], self.random.randint(1, 3))
+        result = await self.call(session, 'POST /plan-trip', 'POST', '/plan-trip', started, json={
+            'country': country,
+            'locations': ', '.join(cities),
+            'days': self.random.choice([3, 5, 7, 10, 14]),
+            'origin': 'New York',
+            'detailLevel': self.random.choice(['standard', 'comprehensive'])
+        })
+        if result and result[0] == 200:
+            self.stats.record_agents(parse_stage_timings(result[1].get('X-Stage-Timings')))
+
+    async def chat(self, session, started):
+        await self.call(session, 'POST /chat', 'POST', '/chat', started, json={
+            'message': self.random.choice(CHAT_MESSAGES),
+            'currentTrip': {'country': 'Japan', 'days': 3}
+        })
+
+    async def trips(self, session, started):
+        await self.call(session, 'GET /api/auth/trips', 'GET', '/api/auth/trips', started, headers=self.auth())
+        if self.trip_ids:
+            trip_id = self.random.choice(self.trip_ids)
+            await self.call(session, 'GET /api/auth/trips/:id', 'GET', f'/api/auth/trips/{trip_id}', headers=self.auth())
+
+    def pick(self, mix: dict):
+        scenarios = list(mix)
+        return getattr(self, self.random.choices(scenarios, weights=[mix[s] for s in scenarios])[0].replace('-', '_'))
+
+    async def run(self, session, mix: dict, concurrency: int, rate: float, duration: float):
+        deadline = time.perf_counter() + duration
+
+        if rate <= 0:
+            async def client():
+                while time.perf_counter() < deadline:
+                    await self.pick(mix)(session, time.perf_counter())
+
+            await asyncio.gather(*(client() for _ in range(concurrency)))
+            return
+
+        slots = asyncio.Semaphore(concurrency)
+        tasks = set()
+
+        async def arrival(scenario, started):
+            async with slots:
+                await scenario(session, started)
+
+        next_arrival = time.perf_counter()
+        while next_arrival < deadline:
+            await asyncio.sleep(max(next_arrival - time.perf_counter(), 0))
+            task = asyncio.ensure_future(arrival(self.pick(mix), next_arrival))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_arrival += self.random.expovariate(rate)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+def start_stand_in_server(port: int, workers: int, workdir: str, with_cache: bool, cassette_dir: str):
+    """Start the backend on local stand-ins: fake LLM, replayed HTTP traffic, temporary SQLite."""
+    env = {
+        **os.environ,
+        'LLM_PROVIDER': os.getenv('LLM_PROVIDER', 'fake'),
+        'HTTP_CASSETTE_MODE': 'replay',
+        'DATABASE_URL': f'sqlite:///{os.path.join(workdir, "loadtest.db")}',
+        'LLM_CACHE_PATH': '',
+        'PLAN_CACHE_PATH': '',
+        'WIKI_CACHE_PATH': '',
+        'EXTRACTION_CACHE_PATH': '',
+        'LLM_CACHE_ENABLED': '1' if with_cache else '0',
+        'PLAN_CACHE_ENABLED': '1' if with_cache else '0',
+        'WIKI_CACHE_ENABLED': '1' if with_cache else '0',
+        'EXTRACTION_CACHE_ENABLED': '1' if with_cache else '0',
+        'PYTHONUNBUFFERED': '1'
+    }
+    if cassette_dir:
+        env['HTTP_CASSETTE_DIR'] = cassette_dir
+    directory = env.get('HTTP_CASSETTE_DIR', os.path.join(BACKEND_DIR, 'cassettes'))
+    if not os.path.isdir(directory) or not os.listdir(directory):
+        print(f'⚠️  No recorded HTTP traffic in {directory}; external API calls will fail immediately. '
+              f'Record some with HTTP_CASSETTE_MODE=record first.')
+
+    log = open(os.path.join(workdir, 'server.log'), 'w')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    return process, log
+
+
+async def wait_until_ready(base_url: str, process=None, timeout: float = 60):
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError('Backend exited during startup')
+            try:
+                # Any response (401 included) means the app is serving
+                async with session.get(f'{base_url}/api/auth/trips', timeout=aiohttp.ClientTimeout(total=2)):
+                    return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                await asyncio.sleep(0.25)
+    raise RuntimeError(f'Backend at {base_url} did not become ready within {timeout}s')
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ('plan-trip', 'chat', 'trips'):
+            raise argparse.ArgumentTypeError(f'Unknown scenario "{name}" (expected plan-trip, chat or trips)')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def print_log_tail(path: str, lines: int = 20):
+    with open(path, encoding='utf-8', errors='replace') as f:
+        tail = f.readlines()[-lines:]
+    if tail:
+        print(f'Last {len(tail)} lines of the backend log:')
+        print(''.join(tail), end='')
+
+
+async def main_async(args) -> dict:
+    workdir = process = log = None
+    base_url = args.target
+
+    try:
+        if not base_url:
+            # Server log and SQLite files, removed when the run is over
+            workdir = tempfile.mkdtemp(prefix='loadtest-')
+            base_url = f'http://127.0.0.1:{args.port}'
+            process, log = start_stand_in_server(args.port, args.workers, workdir, args.with_cache, args.cassettes)
+            print(f'Started backend on {base_url}')
+
+        await wait_until_ready(base_url, process)
+
+        test = LoadTest(base_url, Stats(), args.seed)
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=args.timeout)) as session:
+            await test.setup(session, trips=5)
+            # Setup requests are not part of the measurement
+            stats = test.stats = Stats()
+
+            print(f'Running {args.duration}s at concurrency {args.concurrency}, '
+                  f'{"closed loop" if args.rate <= 0 else f"{args.rate} req/s"}, mix {args.mix}')
+            started = time.perf_counter()
+            await test.run(session, args.mix, args.concurrency, args.rate, args.duration)
+            return stats.report(time.perf_counter() - started)
+
+    except BaseException:
+        # The log is about to be deleted, so show why the backend failed
+        if log is not None:
+            log.flush()
+            print_log_tail(log.name)
+        raise
+
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if log is not None:
+            log.close()
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Load test the backend and report latency percentiles.')
+    parser.add_argument('--target', help='Base URL of a running server (default: start one on local stand-ins)')
+    parser.add_argument('--port', type=int, default=4100, help='Port for the stand-in server')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes for the stand-in server')
+    parser.add_argument('--concurrency', type=int, default=8, help='Maximum requests in flight')
+    parser.add_argument('--rate', type=float, default=0, help='Arrivals per second (0 = closed loop)')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to generate load for')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('plan-trip=1,chat=1,trips=2'),
+                        help='Scenario weights, e.g. plan-trip=1,chat=1,trips=2')
+    parser.add_argument('--timeout', type=float, default=180, help='Per-request client timeout in seconds')
+    parser.add_argument('--with-cache', action='store_true', help='Keep the LLM and plan caches on (in memory)')
+    parser.add_argument('--cassettes', help='Recorded HTTP traffic to replay (default: HTTP_CASSETTE_DIR)')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for request parameters and arrivals')
+    parser.add_argument('--json', dest='json_path', help='Also write the report to this file')
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'\n✓ Report written to {args.json_path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
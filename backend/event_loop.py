@@ -0,0 +1,73 @@
+import os
+import atexit
+import asyncio
+import threading
+import contextvars
+
+# One long-lived event loop per worker process, running on a background thread.
+# Request threads hand coroutines to it instead of creating a loop per request,
+# so anything bound to the loop (aiohttp sessions, keep-alive connections,
+# DNS caches) survives across requests.
+_loop = None
+_loop_pid = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return this process's shared event loop, starting it on first use.
+    A forked worker gets its own loop instead of inheriting the parent's.
+    """
+    global _loop, _loop_pid
+
+    if _loop is not None and _loop_pid == os.getpid():
+        return _loop
+
+    with _lock:
+        if _loop is None or _loop_pid != os.getpid():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='event-loop', daemon=True)
+            thread.start()
+            _loop, _loop_pid = loop, os.getpid()
+
+    return _loop
+
+
+def submit(coro):
+    """
+    Schedule a coroutine on the shared loop from any thread.
+    Returns a concurrent.futures.Future; cancelling it cancels the coroutine.
+    The caller's context variables (such as the request's trace) carry over.
+    """
+    return asyncio.run_coroutine_threadsafe(_in_context(contextvars.copy_context(), coro), get_loop())
+
+
+async def _in_context(context: contextvars.Context, coro):
+    # The loop runs the coroutine in a task with its own context; copy the
+    # caller's values into it so tasks spawned from here inherit them too
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+def run_async(coro, timeout: float = None):
+    """
+    Run a coroutine on the shared loop and block the calling thread until it finishes.
+    """
+    return submit(coro).result(timeout)
+
+
+def shutdown():
+    """
+    Stop the shared loop. Registered to run at interpreter exit.
+    """
+    global _loop
+
+    if _loop is None or _loop_pid != os.getpid():
+        return
+
+    _loop.call_soon_threadsafe(_loop.stop)
+    _loop = None
+
+
+atexit.register(shutdown)
@@ -0,0 +1,145 @@
+import time
+import asyncio
+from agents.tracing import AGENT, span
+
+
+class Stage:
+    """
+    A single step in the agent pipeline.
+    `func` is an async callable that receives the results of `deps`
+    as positional arguments, in the order they are listed.
+    """
+
+    def __init__(self, name: str, func, deps: tuple = ()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+
+class PipelineRun:
+    """
+    Results, errors and timings of one pipeline execution.
+    Timings are (start, end) offsets in seconds from the start of the run.
+    """
+
+    def __init__(self, stages: list):
+        self.deps = {stage.name: stage.deps for stage in stages}
+        self.results = {}
+        self.errors = {}
+        self.timings = {}
+
+    def durations(self) -> dict:
+        """Wall time of each finished stage in milliseconds."""
+        return {name: round((end - start) * 1000, 1) for name, (start, end) in self.timings.items()}
+
+    def critical_path(self) -> list:
+        """
+        Chain of stages that determined the total wall time, as (name, ms) pairs.
+        Walks back from the last stage to finish through the dependency that
+        finished last (the one that actually gated each stage's start).
+        """
+        if not self.timings:
+            return []
+
+        durations = self.durations()
+        name = max(self.timings, key=lambda n: self.timings[n][1])
+        path = []
+
+        while name:
+            path.append((name, durations[name]))
+            finished_deps = [d for d in self.deps[name] if d in self.timings]
+            name = max(finished_deps, key=lambda d: self.timings[d][1]) if finished_deps else None
+
+        return list(reversed(path))
+
+    def format_critical_path(self) -> str:
+        return ' > '.join(f'{name}={ms / 1000:.2f}s' for name, ms in self.critical_path())
+
+    def format_timings(self) -> str:
+        return ', '.join(f'{name}={ms}' for name, ms in self.durations().items())
+
+
+async def run_stage(stage: Stage, args: list):
+    with span(stage.name, AGENT):
+        return await stage.func(*args)
+
+
+async def run_pipeline(stages: list, on_complete=None, cached: dict = None) -> PipelineRun:
+    """
+    Run stages concurrently, starting each one as soon as all of its
+    dependencies have finished. Stages whose dependencies failed are skipped.
+
+    on_complete(name, result, error) is called as each stage finishes.
+    Stages with an entry in `cached` are not run; their cached result is used as-is.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        missing = [d for d in stage.deps if d not in by_name]
+        if missing:
+            raise ValueError(f'Stage "{stage.name}" depends on unknown stage(s): {", ".join(missing)}')
+
+    run = PipelineRun(stages)
+    waiting = dict(by_name)
+    running = {}
+    started_at = time.perf_counter()
+
+    def finish(name, result=None, error=None):
+        if error is None:
+            run.results[name] = result
+        else:
+            run.errors[name] = error
+        if on_complete:
+            on_complete(name, result, error)
+
+    def launch_ready():
+        # Repeat until stable so skips cascade through chains of dependents
+        progress = True
+        while progress:
+            progress = False
+            for name, stage in list(waiting.items()):
+                failed = [d for d in stage.deps if d in run.errors]
+                if failed:
+                    del waiting[name]
+                    finish(name, error=RuntimeError(f'Skipped because "{failed[0]}" failed'))
+                    progress = True
+                    continue
+
+                if all(d in run.results for d in stage.deps):
+                    del waiting[name]
+                    args = [run.results[d] for d in stage.deps]
+                    task = asyncio.ensure_future(run_stage(stage, args))
+                    running[task] = (name, time.perf_counter() - started_at)
+
+    try:
+        for name, result in (cached or {}).items():
+            if name in waiting:
+                del waiting[name]
+                finish(name, result=result)
+
+        launch_ready()
+
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                name, start = running.pop(task)
+                run.timings[name] = (start, time.perf_counter() - started_at)
+                try:
+                    result = task.result()
+                except Exception as err:
+                    finish(name, error=err)
+                    continue
+                finish(name, result=result)
+
+            launch_ready()
+
+        if waiting:
+            raise ValueError(f'Pipeline has a dependency cycle between: {", ".join(waiting)}')
+
+    finally:
+        if running:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+    return run
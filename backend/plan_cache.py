@@ -0,0 +1,109 @@
+import os
+import json
+import hashlib
+from agents.cache_store import INSTANCE_DIR, TieredCache
+
+PLAN_CACHE_ENABLED = os.getenv('PLAN_CACHE_ENABLED', '1') == '1'
+PLAN_CACHE_SIZE = int(os.getenv('PLAN_CACHE_SIZE', 2048))  # Sections kept in memory
+PLAN_CACHE_PATH = os.getenv('PLAN_CACHE_PATH', os.path.join(INSTANCE_DIR, 'plan_cache.db'))  # Empty for memory only
+
+# How long each section stays fresh, in seconds
+WEATHER_TTL = float(os.getenv('PLAN_CACHE_WEATHER_TTL', 30 * 60))
+NEWS_TTL = float(os.getenv('PLAN_CACHE_NEWS_TTL', 2 * 3600))
+ITINERARY_TTL = float(os.getenv('PLAN_CACHE_ITINERARY_TTL', 24 * 3600))
+
+SECTION_TTLS = {
+    'weather_agent': WEATHER_TTL,
+    'news_agent': NEWS_TTL,
+    'itinerary_agent': ITINERARY_TTL,
+    'budget_agent': ITINERARY_TTL,
+    'booking_agent': ITINERARY_TTL,
+    # Derived from the itinerary, so it lives exactly as long as it does
+    'enrich_itinerary': ITINERARY_TTL
+}
+
+plan_cache = TieredCache('plan_sections', maxsize=PLAN_CACHE_SIZE, path=PLAN_CACHE_PATH or None)
+
+
+def normalize_text(value) -> str:
+    """Lowercase and collapse whitespace so trivially different inputs share a key."""
+    return ' '.join(str(value or '').split()).lower()
+
+
+def normalize_locations(locations: str) -> list:
+    """Normalized, non-empty entries of a comma-separated location list, in input order."""
+    return [normalize_text(loc) for loc in (locations or '').split(',') if loc.strip()]
+
+
+def section_keys(params: dict) -> dict:
+    """
+    Cache key for every pipeline stage of a trip plan.
+    Each key only covers the parameters that stage actually depends on.
+    Location order is kept for the itinerary and budget, whose prompts (and the
+    budget's "city") list the locations as given, and is ignored for news,
+    which searches for any of them.
+    """
+    locations = normalize_locations(params['locations'])
+    first_location = locations[0] if locations else ''
+
+    base = {
+        'country': normalize_text(params['country']),
+        'days': normalize_text(params['days']),
+    }
+    itinerary_fields = {
+        **base,
+        'locations': locations,
+        'origin': normalize_text(params['origin']),
+        'additional_details': normalize_text(params['additional_details']),
+        'detail_level': normalize_text(params['detail_level'])
+    }
+
+    fields = {
+        'itinerary_agent': itinerary_fields,
+        'budget_agent': {key: value for key, value in itinerary_fields.items() if key != 'detail_level'},
+        'booking_agent': {**base, 'first_location': first_location, 'origin': normalize_text(params['origin'])},
+        'weather_agent': {**base, 'first_location': first_location},
+        'news_agent': {'country': base['country'], 'locations': sorted(locations)},
+        # Wikipedia links and map data; geocoding is biased towards the first location
+        'enrich_itinerary': {**itinerary_fields, 'first_location': first_location}
+    }
+
+    return {
+        name: hashlib.sha256(json.dumps({'section': name, **values}, sort_keys=True).encode('utf-8')).hexdigest()
+        for name, values in fields.items()
+    }
+
+
+def is_cacheable(result) -> bool:
+    """Failed or empty agent results are never cached."""
+    if not result:
+        return False
+    if isinstance(result, dict) and 'error' in result:
+        return False
+    return True
+
+
+def lookup_sections(stages: list, keys: dict) -> dict:
+    """
+    Fresh cached results for the given stages.
+    A stage that depends on others is only reused if all of its inputs were
+    reused too, so derived sections never mix with a newly generated itinerary.
+    """
+    if not PLAN_CACHE_ENABLED:
+        return {}
+
+    cached = {}
+    for stage in stages:
+        if any(dep not in cached for dep in stage.deps):
+            continue
+        result = plan_cache.get(keys[stage.name])
+        if result is not None:
+            cached[stage.name] = result
+
+    return cached
+
+
+def store_section(keys: dict, name: str, result):
+    """Cache a freshly computed section with its own TTL."""
+    if PLAN_CACHE_ENABLED and is_cacheable(result):
+        plan_cache.set(keys[name], result, ttl=SECTION_TTLS[name])
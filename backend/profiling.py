@@ -0,0 +1,170 @@
+import os
+import sys
+import time
+import random
+import threading
+from collections import Counter
+from agents.cache_store import INSTANCE_DIR
+
+# Opt-in wall-clock profiling of whole requests. A background thread samples
+# the stacks of the request thread, the shared event loop and the LLM workers,
+# and each profile is written in the collapsed-stack format that flamegraph.pl,
+# speedscope and inferno read directly. A request is profiled when it sends
+# X-Profile: 1 (in debug mode or with a valid login, see app.py), when it is
+# picked by PROFILE_SAMPLE_RATE, or, with PROFILE_SLOW_MS set, whenever it
+# turns out slower than that threshold.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '0') == '1'
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))  # Share of requests to profile
+PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', 0))  # Keep profiles of requests slower than this; 0 = off
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))  # Time between stack samples
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(INSTANCE_DIR, 'profiles'))
+
+# Threads doing work on behalf of a request besides the request thread itself.
+# The event loop is shared, so concurrent requests show up in each other's profiles.
+SHARED_THREADS = ('event-loop', 'llm')
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _collapse(frame) -> str:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(stack))
+
+
+class Profile:
+    """Collapsed stacks sampled for one request."""
+
+    def __init__(self, name: str, thread_id: int, keep_if_slower_than: float = None):
+        self.name = name
+        self.thread_id = thread_id
+        # None means keep regardless of duration (requested or sampled)
+        self.keep_if_slower_than = keep_if_slower_than
+        self.samples = Counter()
+        self.started = time.perf_counter()
+        self.duration_ms = None
+
+    def add(self, stacks: dict):
+        for (thread_id, label), stack in stacks.items():
+            if thread_id == self.thread_id:
+                self.samples[f'request;{stack}'] += 1
+            elif label != 'request':
+                self.samples[f'{label};{stack}'] += 1
+
+    def should_keep(self) -> bool:
+        return self.keep_if_slower_than is None or self.duration_ms >= self.keep_if_slower_than
+
+    def write(self, directory: str = None) -> str:
+        directory = directory or PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        safe_name = ''.join(c if c.isalnum() else '-' for c in self.name).strip('-')
+        path = os.path.join(directory, f'{time.strftime("%Y%m%d-%H%M%S")}-{safe_name}-{self.duration_ms:.0f}ms.folded')
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f'{stack} {count}\n')
+        return path
+
+
+class Sampler:
+    """
+    One background thread sampling every thread's stack while any profile is
+    active. Stacks are collapsed once per tick and shared by all active profiles.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._profiles = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, profile: Profile):
+        with self._lock:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self, profile: Profile) -> Counter:
+        """
+        Stop sampling for a profile. Returns a copy of its samples, which no
+        tick adds to any more.
+        """
+        with self._lock:
+            self._profiles.discard(profile)
+            return Counter(profile.samples)
+
+    def _tick(self, profiles: list):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        wanted = {profile.thread_id for profile in profiles}
+        stacks = {}
+        for thread_id, frame in sys._current_frames().items():
+            name = names.get(thread_id, '')
+            label = next((shared for shared in SHARED_THREADS if name.startswith(shared)), None)
+            if label == 'llm' and frame.f_code.co_name == '_worker':
+                # Idle pool thread waiting for work
+                continue
+            if thread_id in wanted or label:
+                stacks[(thread_id, label or 'request')] = _collapse(frame)
+
+        # Under the lock, so a profile is never added to after stop() returns
+        with self._lock:
+            for profile in profiles:
+                if profile in self._profiles:
+                    profile.add(stacks)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                profiles = list(self._profiles)
+                if not profiles:
+                    self._thread = None
+                    return
+            self._tick(profiles)
+            time.sleep(self.interval)
+
+
+sampler = Sampler(PROFILE_INTERVAL_MS / 1000)
+
+
+def start_profile(name: str, requested: bool = False):
+    """
+    Start profiling the current request if it asked for it, is sampled, or
+    could turn out slow. Returns the profile, or None if not profiling.
+    """
+    if not PROFILING_ENABLED:
+        return None
+
+    if requested or (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+        profile = Profile(name, threading.get_ident())
+    elif PROFILE_SLOW_MS:
+        profile = Profile(name, threading.get_ident(), keep_if_slower_than=PROFILE_SLOW_MS)
+    else:
+        return None
+
+    sampler.start(profile)
+    return profile
+
+
+def finish_profile(profile: Profile):
+    """Stop sampling and write the profile if it is kept. Returns the file path or None."""
+    if profile is None or profile.duration_ms is not None:
+        return None
+
+    profile.samples = sampler.stop(profile)
+    profile.duration_ms = (time.perf_counter() - profile.started) * 1000
+    if not profile.should_keep() or not profile.samples:
+        return None
+
+    try:
+        path = profile.write()
+    except OSError as e:
+        print(f'✗ Could not write profile for {profile.name}: {e}')
+        return None
+
+    print(f'🔥 Profile of {profile.name} ({profile.duration_ms:.0f}ms) written to {path}')
+    return path